@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of how the kernel channel reader handles incoming messages.
+
+Compares decoding every message with json.loads (no pre-filter) against the
+reader's msg_id pre-filter followed by json.loads or orjson, for large stream
+output, DataFrames printed as text and traffic addressed to other requests.
+
+Example:
+    python benchmarks/decode_benchmark.py --repeat 200
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+import uuid
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import server as open_skills_server
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def make_message(parent_msg_id: str, msg_type: str, content: dict) -> str:
+    header = {"msg_id": uuid.uuid4().hex, "msg_type": msg_type, "session": uuid.uuid4().hex,
+              "username": "kernel", "date": "2025-01-01T00:00:00.000000Z", "version": "5.3"}
+    parent_header = {"msg_id": parent_msg_id, "msg_type": "execute_request", "session": uuid.uuid4().hex,
+                     "username": "", "date": "2025-01-01T00:00:00.000000Z", "version": "5.3"}
+    return json.dumps({"header": header, "msg_id": header["msg_id"], "msg_type": msg_type,
+                       "parent_header": parent_header, "metadata": {}, "content": content,
+                       "buffers": [], "channel": "iopub"})
+
+
+def dataframe_text(rows: int, columns: int) -> str:
+    """Text shaped like print(df) for a numeric DataFrame"""
+    lines = ["       " + "  ".join(f"col_{c:<6}" for c in range(columns))]
+    for r in range(rows):
+        lines.append(f"{r:<6} " + "  ".join(f"{(r * 31 + c * 17) % 1000 / 7:>10.4f}" for c in range(columns)))
+    return "\n".join(lines)
+
+
+def scenarios(own_msg_id: str) -> dict:
+    other_msg_id = uuid.uuid4().hex
+    return {
+        "stream 1 MB": [make_message(own_msg_id, "stream", {"name": "stdout", "text": ("x" * 79 + "\n") * 13_000})],
+        "dataframe 5000x12": [make_message(own_msg_id, "execute_result",
+                                           {"data": {"text/plain": dataframe_text(5000, 12)}, "metadata": {},
+                                            "execution_count": 1})],
+        "small stream x1000": [make_message(own_msg_id, "stream", {"name": "stdout", "text": f"line {i}\n"})
+                               for i in range(1000)],
+        "other request x1000": [make_message(other_msg_id, "stream", {"name": "stdout", "text": f"line {i}\n" * 20})
+                                for i in range(1000)],
+    }
+
+
+def run(messages: list, handler, repeat: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            handler(message)
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+
+def main(args):
+    channel = open_skills_server.KernelChannel("benchmark", open_skills_server.JUPYTER_WS_URL)
+    own_msg_id = uuid.uuid4().hex
+    channel._pending[own_msg_id] = None
+
+    handlers = {"json, no filter": json.loads}
+
+    def filtered(loads):
+        def handle(message):
+            if channel._may_be_pending_reply(message):
+                loads(message)
+        return handle
+
+    handlers["filter + json"] = filtered(json.loads)
+    if orjson is not None:
+        handlers["filter + orjson"] = filtered(orjson.loads)
+
+    print(f"{'scenario':<22}" + "".join(f"{name:>18}" for name in handlers) + "   (ms per batch)")
+    for name, messages in scenarios(own_msg_id).items():
+        timings = [run(messages, handler, args.repeat) for handler in handlers.values()]
+        print(f"{name:<22}" + "".join(f"{t:>18.3f}" for t in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="Repetitions of each scenario")
+    main(parser.parse_args())
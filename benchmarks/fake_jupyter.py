@@ -0,0 +1,210 @@
+"""
+In-process stand-in for the Jupyter Server kernels API, used by the benchmarks.
+
+Implements the parts of the /api/status and /api/kernels REST API and the
+/channels WebSocket protocol that server.py relies on (server status, kernel
+create/list/get/delete/interrupt/restart, execute_request and
+kernel_info_request), with configurable kernel startup latency, execution
+latency and output size. It does not run any code.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeKernel:
+    def __init__(self, kernel_id: str):
+        self.kernel_id = kernel_id
+        self.execution_state = "idle"
+        self.last_activity = _now()
+        self.execution_count = 0
+        # A kernel runs one shell request at a time, like a real one
+        self.shell_lock = asyncio.Lock()
+
+    def model(self) -> dict:
+        return {
+            "id": self.kernel_id,
+            "name": "python3",
+            "last_activity": self.last_activity,
+            "execution_state": self.execution_state,
+            "connections": 0,
+        }
+
+
+class FakeJupyterServer:
+    """
+    Fake Jupyter server.
+
+    Args:
+        startup_latency: Seconds a POST /api/kernels takes.
+        execution_latency: Seconds each execute_request takes.
+        output_bytes: Characters of stdout produced by each execute_request.
+        output_messages: Number of stream messages the output is split into.
+    """
+
+    def __init__(self, startup_latency: float = 0.0, execution_latency: float = 0.0,
+                 output_bytes: int = 16, output_messages: int = 1):
+        self.startup_latency = startup_latency
+        self.execution_latency = execution_latency
+        self.output_bytes = output_bytes
+        self.output_messages = max(output_messages, 1)
+        self.kernels = {}
+        self.started = _now()
+        self.app = Starlette(routes=[
+            Route("/api/status", self.status, methods=["GET"]),
+            Route("/api/kernels", self.list_kernels, methods=["GET"]),
+            Route("/api/kernels", self.create_kernel, methods=["POST"]),
+            Route("/api/kernels/{kernel_id}", self.get_kernel, methods=["GET"]),
+            Route("/api/kernels/{kernel_id}", self.delete_kernel, methods=["DELETE"]),
+            Route("/api/kernels/{kernel_id}/interrupt", self.interrupt_kernel, methods=["POST"]),
+            Route("/api/kernels/{kernel_id}/restart", self.restart_kernel, methods=["POST"]),
+            WebSocketRoute("/api/kernels/{kernel_id}/channels", self.channels),
+        ])
+        self._server = None
+        self._serve_task = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8899):
+        """Serve the fake API on host:port in the current event loop"""
+        config = uvicorn.Config(self.app, host=host, port=port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._serve_task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._serve_task.done():
+                self._serve_task.result()
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._serve_task
+
+    # --- REST API ---
+
+    async def status(self, request):
+        return JSONResponse({
+            "started": self.started,
+            "last_activity": _now(),
+            "connections": 0,
+            "kernels": len(self.kernels),
+        })
+
+    async def list_kernels(self, request):
+        return JSONResponse([kernel.model() for kernel in self.kernels.values()])
+
+    async def create_kernel(self, request):
+        await asyncio.sleep(self.startup_latency)
+        kernel = FakeKernel(str(uuid.uuid4()))
+        self.kernels[kernel.kernel_id] = kernel
+        return JSONResponse(kernel.model(), status_code=201)
+
+    async def get_kernel(self, request):
+        kernel = self.kernels.get(request.path_params["kernel_id"])
+        if kernel is None:
+            return JSONResponse({"message": "Kernel does not exist"}, status_code=404)
+        return JSONResponse(kernel.model())
+
+    async def delete_kernel(self, request):
+        if self.kernels.pop(request.path_params["kernel_id"], None) is None:
+            return JSONResponse({"message": "Kernel does not exist"}, status_code=404)
+        return Response(status_code=204)
+
+    async def interrupt_kernel(self, request):
+        if request.path_params["kernel_id"] not in self.kernels:
+            return JSONResponse({"message": "Kernel does not exist"}, status_code=404)
+        return Response(status_code=204)
+
+    async def restart_kernel(self, request):
+        kernel = self.kernels.get(request.path_params["kernel_id"])
+        if kernel is None:
+            return JSONResponse({"message": "Kernel does not exist"}, status_code=404)
+        await asyncio.sleep(self.startup_latency)
+        kernel.execution_count = 0
+        return JSONResponse(kernel.model())
+
+    # --- Channels WebSocket ---
+
+    async def channels(self, websocket: WebSocket):
+        kernel = self.kernels.get(websocket.path_params["kernel_id"])
+        if kernel is None:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        tasks = set()
+        try:
+            while True:
+                request = json.loads(await websocket.receive_text())
+                task = asyncio.create_task(self._handle(kernel, websocket, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send(self, websocket: WebSocket, request: dict, channel: str, msg_type: str, content: dict):
+        await websocket.send_text(json.dumps({
+            "header": {
+                "msg_id": uuid.uuid4().hex,
+                "msg_type": msg_type,
+                "session": request["header"].get("session", ""),
+                "username": "kernel",
+                "date": _now(),
+                "version": "5.3",
+            },
+            "parent_header": request["header"],
+            "metadata": {},
+            "content": content,
+            "buffers": [],
+            "channel": channel,
+        }))
+
+    async def _handle(self, kernel: FakeKernel, websocket: WebSocket, request: dict):
+        msg_type = request.get("header", {}).get("msg_type")
+        if msg_type == "kernel_info_request":
+            await self._send(websocket, request, "shell", "kernel_info_reply", {
+                "status": "ok",
+                "protocol_version": "5.3",
+                "implementation": "fake",
+                "language_info": {"name": "python"},
+            })
+        elif msg_type == "execute_request":
+            async with kernel.shell_lock:
+                await self._execute(kernel, websocket, request)
+
+    async def _execute(self, kernel: FakeKernel, websocket: WebSocket, request: dict):
+        kernel.execution_state = "busy"
+        kernel.execution_count += 1
+        await self._send(websocket, request, "iopub", "status", {"execution_state": "busy"})
+        if self.execution_latency:
+            await asyncio.sleep(self.execution_latency)
+
+        silent = request.get("content", {}).get("silent", False)
+        if not silent and self.output_bytes:
+            chunk_size = -(-self.output_bytes // self.output_messages)
+            line = ("x" * 79 + "\n") * (chunk_size // 80 + 1)
+            remaining = self.output_bytes
+            while remaining > 0:
+                text = line[:min(chunk_size, remaining)]
+                remaining -= len(text)
+                await self._send(websocket, request, "iopub", "stream", {"name": "stdout", "text": text})
+
+        await self._send(websocket, request, "shell", "execute_reply", {
+            "status": "ok",
+            "execution_count": kernel.execution_count,
+            "user_expressions": {},
+        })
+        kernel.execution_state = "idle"
+        kernel.last_activity = _now()
+        await self._send(websocket, request, "iopub", "status", {"execution_state": "idle"})
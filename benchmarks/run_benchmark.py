@@ -0,0 +1,169 @@
+"""
+Benchmark the MCP tools against a fake Jupyter server.
+
+Starts the fake Jupyter server (fake_jupyter.py) and the MCP app from
+server.py in this process, then calls a tool over streamable HTTP at each
+requested concurrency level. Every concurrent worker uses its own MCP session,
+like separate conversations. Reports latency percentiles, throughput and the
+RSS of the process (which includes the fake Jupyter server).
+
+Example:
+    python benchmarks/run_benchmark.py --concurrency 1,4,16 --requests 200 --execution-latency 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import pathlib
+import sys
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import uvicorn
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+import server as open_skills_server
+from fake_jupyter import FakeJupyterServer
+
+
+def read_rss_mb() -> dict:
+    """Current and peak resident memory of this process"""
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return {"rss_mb": usage.get("VmRSS"), "peak_rss_mb": usage.get("VmHWM")}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_level(mcp_url: str, concurrency: int, total_requests: int, tool: str, arguments: dict) -> dict:
+    """Run total_requests tool calls spread over `concurrency` MCP sessions"""
+    latencies = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        async with streamablehttp_client(mcp_url) as (read_stream, write_stream, _):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                # Unmeasured first call: pins the session to a kernel
+                await session.call_tool(tool, arguments)
+                while remaining > 0:
+                    remaining -= 1
+                    start_time = time.perf_counter()
+                    result = await session.call_tool(tool, arguments)
+                    latencies.append(time.perf_counter() - start_time)
+                    text = result.content[0].text if result.content else ""
+                    if result.isError or text.startswith("Error"):
+                        errors += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        **read_rss_mb(),
+    }
+
+
+async def main(args):
+    fake_jupyter = FakeJupyterServer(
+        startup_latency=args.startup_latency,
+        execution_latency=args.execution_latency,
+        output_bytes=args.output_bytes,
+        output_messages=args.output_messages,
+    )
+    await fake_jupyter.start(port=args.jupyter_port)
+
+    # Point the MCP server at the fake Jupyter server
+    open_skills_server.JUPYTER_HTTP_URL = f"http://127.0.0.1:{args.jupyter_port}"
+    open_skills_server.JUPYTER_WS_URL = f"ws://127.0.0.1:{args.jupyter_port}"
+    open_skills_server.KERNEL_ID_FILE_PATH = pathlib.Path("/nonexistent/python_kernel_id.txt")
+    open_skills_server.MIN_KERNELS = args.min_kernels
+    open_skills_server.MAX_KERNELS = args.max_kernels
+
+    config = uvicorn.Config(open_skills_server.app, host="127.0.0.1", port=args.mcp_port, log_level="warning")
+    mcp_server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(mcp_server.serve())
+    while not mcp_server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+
+    if args.tool == "execute_python_code":
+        arguments = {"command": args.code}
+    else:
+        arguments = json.loads(args.arguments)
+
+    mcp_url = f"http://127.0.0.1:{args.mcp_port}/mcp"
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            results.append(await run_level(mcp_url, concurrency, args.requests, args.tool, arguments))
+    finally:
+        mcp_server.should_exit = True
+        await serve_task
+        await fake_jupyter.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{args.tool}: {args.requests} requests per level, "
+          f"execution latency {args.execution_latency * 1000:.0f} ms, output {args.output_bytes} chars\n")
+    header = f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['concurrency']:>11} {r['requests']:>8} {r['errors']:>6} {r['throughput_per_s']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{r['rss_mb'] or 0:>8.1f} {r['peak_rss_mb'] or 0:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 4, 16],
+                        help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per level")
+    parser.add_argument("--tool", default="execute_python_code", help="MCP tool to call")
+    parser.add_argument("--code", default="print('hello')", help="Code for execute_python_code")
+    parser.add_argument("--arguments", default="{}", help="JSON arguments for other tools")
+    parser.add_argument("--execution-latency", type=float, default=0.0, help="Seconds per fake execution")
+    parser.add_argument("--startup-latency", type=float, default=0.0, help="Seconds per fake kernel start")
+    parser.add_argument("--output-bytes", type=int, default=16, help="Characters of stdout per execution")
+    parser.add_argument("--output-messages", type=int, default=1, help="Stream messages the output is split into")
+    parser.add_argument("--min-kernels", type=int, default=open_skills_server.MIN_KERNELS)
+    parser.add_argument("--max-kernels", type=int, default=open_skills_server.MAX_KERNELS)
+    parser.add_argument("--jupyter-port", type=int, default=8899)
+    parser.add_argument("--mcp-port", type=int, default=8223)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the MCP server")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(main(args))
@@ -48,4 +48,6 @@ npx -y playwright@1.53.0 run-server --port 3000 --host 0.0.0.0 &
 # exec python mcp_main.py
 
 # Start FastAPI application
-exec uvicorn server:app --host 0.0.0.0 --port 8222 --workers 1 --no-access-log
\ No newline at end of file
+# Several workers share the kernel pool through /app/uploads/.kernel_pool.sqlite3
+export MCP_WORKERS="${MCP_WORKERS:-1}"
+exec uvicorn server:app --host 0.0.0.0 --port 8222 --workers "$MCP_WORKERS" --no-access-log
\ No newline at end of file
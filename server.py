@@ -2,14 +2,29 @@
 import asyncio
 import base64
 import binascii
+import bisect
+import contextlib
+import functools
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
 import os
+import random
+import re
+import shutil
+import sqlite3
+import threading
 import zipfile
 import pathlib
 import time
 import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Set
+from urllib.parse import urlparse
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime, timedelta
@@ -21,6 +36,12 @@ import httpx
 from mcp.server.fastmcp import FastMCP, Context
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
+from starlette.responses import JSONResponse, PlainTextResponse
+try:
+    # Optional, decodes kernel channel messages several times faster
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 import socket
 # --- CONFIGURATION & SETUP ---
 logging.basicConfig(
@@ -28,25 +49,72 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Number of uvicorn worker processes (set by entrypoint.sh). Several workers
+# share the kernels through POOL_COORDINATION_DB, and MCP sessions can't live in
+# one worker's memory then, so the MCP server runs stateless
+MCP_WORKERS = int(os.environ.get("MCP_WORKERS", "1"))
+# Identifies this worker process in the pool database and in /metrics
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
 # Initialize the MCP server with a descriptive name for the toolset
-mcp = FastMCP("Open-Skills")
+mcp = FastMCP("Open-Skills", stateless_http=MCP_WORKERS > 1)
 
 # Kernel pool configuration
 MAX_KERNELS = 5
 MIN_KERNELS = 2
+MIN_IDLE_KERNELS = 1  # warm idle kernels the replenisher keeps ready (bounded by MAX_KERNELS)
+KERNEL_CREATE_RETRY_DELAY = 5  # seconds to wait before retrying a failed kernel creation
 KERNEL_TIMEOUT = 300  # 5 minutes
 KERNEL_HEALTH_CHECK_INTERVAL = 30  # 30 seconds
+KERNEL_HEALTH_CHECK_TIMEOUT = 10  # seconds to wait for a kernel_info_reply
+KERNEL_INTERRUPT_TIMEOUT = 10  # seconds for interrupted code to stop before the kernel is restarted
+KERNEL_RESTART_TIMEOUT = 60  # seconds for a restarted kernel to answer again
+KERNEL_RECYCLE_MAX_EXECUTIONS = 500  # executions before a kernel is recycled (None = no limit)
+KERNEL_RECYCLE_MAX_RSS_MB = 2048  # resident memory before a kernel is recycled, local kernels only (None = no limit)
+KERNEL_RECYCLE_MAX_AGE = 86400  # seconds before a kernel is recycled (None = no limit)
 MAX_RETRY_ATTEMPTS = 3
 RETRY_BACKOFF_BASE = 2  # exponential backoff base
+KERNEL_ACQUIRE_TIMEOUT = 120  # max seconds a request waits in the queue for a kernel
+KERNEL_WAIT_QUEUE_MAX = 50  # max queued requests before new ones are rejected
+
+# Execution scheduling: priority classes (lower runs first) and per-client admission control
+PRIORITY_CLASSES = {"interactive": 0, "batch": 10}
+DEFAULT_PRIORITY_CLASS = "interactive"
+PRIORITY_CLASS_MAX_QUEUE_WAIT = {"interactive": 60, "batch": 900}  # seconds, covers admission and kernel wait
+MAX_CONCURRENT_EXECUTIONS_PER_CLIENT = 3  # per priority class, so batch jobs never block a client's interactive calls
+MAX_CONCURRENT_BATCH_EXECUTIONS = MAX_KERNELS - 1  # keep kernels free for interactive calls
+CLIENT_ID_HEADER = "x-client-id"  # falls back to the MCP session ID, callers with neither have no per-client quota
+PRIORITY_HEADER = "x-execution-priority"
+
+# Sticky sessions: consecutive calls from one conversation run on the same kernel
+STICKY_SESSIONS_ENABLED = True  # derive the session key from the MCP session ID header
+STICKY_SESSION_IDLE_TIMEOUT = 1800  # seconds before an unused session releases its kernel
+STICKY_SESSIONS_MAX_RSS_MB = 4096  # total memory of pinned kernels before LRU sessions are recycled (None = no limit)
 
 # Jupyter connection settings
 JUPYTER_WS_URL = "ws://127.0.0.1:8888"
 JUPYTER_HTTP_URL = "http://127.0.0.1:8888"
 
+# Jupyter backends to place kernels on. Each entry is a dict with "name",
+# "http_url" and "ws_url", and optionally "weight" (relative capacity, default 1)
+# and "max_kernels". Empty: a single backend at JUPYTER_HTTP_URL / JUPYTER_WS_URL.
+JUPYTER_BACKENDS: list = []
+KERNEL_PLACEMENT_POLICY = "least_loaded"  # "least_loaded" (fewest kernels per weight) or "weighted" (random by weight)
+JUPYTER_BACKEND_RETIRE_AFTER = 300  # seconds a backend may be unreachable before its kernels are given up
+
+# Shared Jupyter REST client settings (keep-alive connection pool)
+JUPYTER_HTTP_MAX_CONNECTIONS = 20
+JUPYTER_HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+JUPYTER_HTTP_KEEPALIVE_EXPIRY = 60.0
+JUPYTER_HTTP_CONNECT_TIMEOUT = 5.0
+JUPYTER_HTTP_TIMEOUT = 30.0  # read/write/pool timeout of every REST call (kernel restarts and status probes have their own)
+
 # Enhanced WebSocket settings
-WEBSOCKET_TIMEOUT = 600  # 10 minutes for long operations
+WEBSOCKET_TIMEOUT = 600  # 10 minutes for long operations (default execution timeout)
+MAX_EXECUTION_TIMEOUT = 3600  # upper bound for the per-call timeout of execute_python_code
 WEBSOCKET_PING_INTERVAL = 30
 WEBSOCKET_PING_TIMEOUT = 10
+WEBSOCKET_MAX_MESSAGE_SIZE = 64 * 1024 * 1024  # rich outputs (images, PDFs) can be large
 
 # Directory configuration (ensure this matches your Jupyter/Docker setup)
 # This directory must be accessible by both this script and the Jupyter kernel.
@@ -58,6 +126,94 @@ KERNEL_ID_FILE_PATH = SHARED_DIR / "python_kernel_id.txt"
 SKILLS_DIR = SHARED_DIR / "skills"
 PUBLIC_SKILLS_DIR = SKILLS_DIR / "public"
 USER_SKILLS_DIR = SKILLS_DIR / "user"
+SKILL_INDEX_REFRESH_INTERVAL = 2.0  # seconds between scans for added or removed skills (one stat per skills directory)
+SKILL_INDEX_FULL_SCAN_INTERVAL = 60.0  # seconds between scans that also stat every SKILL.md for edits in place
+SKILL_ARCHIVE_WORKERS = 2  # threads that unpack .zip skill archives dropped into USER_SKILLS_DIR
+SKILL_SEARCH_NAME_WEIGHT = 3  # times a skill name term counts in search_skills ranking, SKILL.md body terms count once
+SKILL_SEARCH_DESCRIPTION_WEIGHT = 2
+SKILL_SEARCH_MAX_LIMIT = 50
+LIST_SKILLS_DEFAULT_LIMIT = 100  # skills per list_skills page
+LIST_SKILLS_MAX_LIMIT = 500
+SKILL_FILE_CACHE_MAX_CHARS = 16_000_000  # skill documents kept in memory by get_skill_info/get_skill_file
+
+# Pool coordination between workers: kernels are registered in an SQLite
+# database and a worker holds a lease on a kernel while it runs code on it.
+# Leases are renewed while the worker lives and expire POOL_LEASE_TTL seconds
+# after it dies. Replicas on one host that share SHARED_DIR coordinate the same way.
+POOL_COORDINATION_ENABLED = MCP_WORKERS > 1
+POOL_COORDINATION_DB = SHARED_DIR / ".kernel_pool.sqlite3"
+POOL_LEASE_TTL = 30  # seconds
+POOL_SYNC_INTERVAL = 1.0  # seconds between lease renewals and refreshes of the shared pool state
+POOL_DB_BUSY_TIMEOUT = 2.0  # seconds to wait for another worker's transaction
+
+# Metrics live in each worker's memory. With several workers, each one exports
+# its samples to METRICS_DIR every METRICS_EXPORT_INTERVAL seconds with a
+# worker label, and /metrics serves those of all workers, whichever answers.
+# Sum over the worker label for pool-wide totals; the kernel gauges are each
+# worker's view of the shared pool.
+METRICS_DIR = SHARED_DIR / ".metrics"
+METRICS_EXPORT_INTERVAL = 5.0  # seconds, exports older than 3 intervals belong to dead workers
+
+# Kernel warm-up: run on every new kernel before it is handed out, so the first
+# user request on it doesn't pay for cold imports and the matplotlib font cache.
+# Modules that are not installed are skipped.
+KERNEL_WARMUP_SYS_PATHS = [str(SKILLS_DIR)]
+KERNEL_WARMUP_IMPORTS = [
+    "numpy",
+    "pandas",
+    "matplotlib.pyplot",
+    "PIL.Image",
+    "reportlab.pdfgen.canvas",
+    "pypdf",
+]
+# Set before the imports. The inline backend sends figures as display_data,
+# which are saved as artifacts; "Agg" renders only to files (None = leave as is)
+KERNEL_WARMUP_MATPLOTLIB_BACKEND = "module://matplotlib_inline.backend_inline"
+KERNEL_WARMUP_EXTRA_CODE = ""  # any additional setup code, e.g. "import warnings; warnings.simplefilter('ignore')"
+KERNEL_WARMUP_TIMEOUT = 120  # seconds
+
+# Output limits: long output keeps its first and last characters, the full
+# log is written to OUTPUT_SPILL_DIR and its path is returned instead
+OUTPUT_HEAD_CHARS = 10_000
+OUTPUT_TAIL_CHARS = 40_000
+OUTPUT_SPILL_DIR = SHARED_DIR / "outputs" / "logs"
+
+# Rich outputs (figures, HTML, JSON) are saved once under ARTIFACTS_DIR with
+# content-hash names and referenced by path in the result
+ARTIFACTS_DIR = SHARED_DIR / "outputs"
+ARTIFACT_MIME_TYPES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/svg+xml": ".svg",
+    "application/pdf": ".pdf",
+    "text/html": ".html",
+    "application/json": ".json",
+}
+ARTIFACT_BASE64_MIME_TYPES = {"image/png", "image/jpeg", "image/gif", "application/pdf"}
+# Not saved for execute_result values that have a text/plain repr (e.g. every DataFrame)
+ARTIFACT_TEXT_FALLBACK_MIME_TYPES = {"text/html", "application/json"}
+
+# Retention of saved artifacts and spill logs: those not written or referenced
+# for OUTPUT_RETENTION_MAX_AGE are deleted, then the oldest ones until together
+# they fit in OUTPUT_RETENTION_MAX_BYTES. Checked every OUTPUT_RETENTION_INTERVAL.
+# Other files in ARTIFACTS_DIR (user files, files written by skills) are never touched.
+OUTPUT_RETENTION_MAX_AGE = 7 * 24 * 3600  # seconds
+OUTPUT_RETENTION_MAX_BYTES = 2 * 1024 ** 3
+OUTPUT_RETENTION_INTERVAL = 600  # seconds
+
+# Execution timing: every execute_python_code call records when it was queued,
+# admitted, got a kernel, connected, sent the request, saw first output, went
+# idle and released the kernel
+EXECUTION_TIMING_LOG = True  # log one structured timing record per execution
+EXECUTION_TIMING_IN_RESULT = False  # append a compact timing summary to the tool result
+
+# Progress notifications: stream output is coalesced so a tight print loop
+# sends a few notifications per second instead of one per message
+PROGRESS_MAX_UPDATES_PER_SECOND = 4
+PROGRESS_COALESCE_WINDOW = 0.25  # seconds to collect output before sending it
+PROGRESS_MAX_MESSAGE_CHARS = 2000  # newest output kept per notification; a full buffer is sent right away
+PROGRESS_CLOSE_TIMEOUT = 2  # seconds to wait for the last notification when a call ends
 
 def resolve_with_system_dns(hostname):
     try:
@@ -86,6 +242,241 @@ class KernelTimeoutError(KernelError):
     """Raised when kernel operation times out"""
     pass
 
+class KernelConnectionError(KernelError):
+    """Raised when the connection to a kernel fails or the kernel dies"""
+    def __init__(self, message: str, execution_started: bool = False):
+        super().__init__(message)
+        # Whether the execute_request had been sent, i.e. the code may have (partly) run
+        self.execution_started = execution_started
+
+class KernelPoolSaturatedError(NoKernelAvailableError):
+    """Raised when the kernel wait queue is full"""
+    pass
+
+class AdmissionTimeoutError(NoKernelAvailableError):
+    """Raised when a request waits longer than its priority class allows"""
+    pass
+
+# --- METRICS ---
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Metric:
+    """Base class for a metric family with a fixed set of label names"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, object] = {}
+        METRICS.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple, extra: Optional[tuple] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, value in self._values.items():
+            lines.extend(self._render_value(key, value))
+        return lines
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+class Histogram(_Metric):
+    type_name = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket counts (cumulated when rendering), sum, count
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def _render_value(self, key, value):
+        bucket_counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', str(bound)))} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+METRICS: list = []
+
+TOOL_DURATION = Histogram("openskills_tool_duration_seconds", "Duration of MCP tool calls", ("tool", "outcome"))
+KERNEL_ACQUIRE_WAIT = Histogram("openskills_kernel_acquire_wait_seconds", "Time spent waiting for a kernel", ("tool",))
+ADMISSION_WAIT = Histogram("openskills_admission_wait_seconds",
+                           "Time admitted executions waited for an execution slot", ("priority",))
+ADMISSION_REJECTIONS = Counter("openskills_admission_rejections_total",
+                               "Executions rejected after waiting too long for an execution slot", ("priority",))
+KERNEL_EXECUTION_DURATION = Histogram("openskills_kernel_execution_seconds", "Duration of code execution on a kernel", ("tool",))
+EXECUTION_PHASE_DURATION = Histogram("openskills_execution_phase_seconds",
+                                     "Duration of execution phases, named by the event that ends them", ("phase",))
+WEBSOCKET_CONNECT_DURATION = Histogram("openskills_websocket_connect_seconds", "Time to open a kernel channel WebSocket")
+PAGE_SCRAPE_DURATION = Histogram("openskills_page_scrape_seconds", "Time to load and extract a web page", ("outcome",))
+EXECUTION_RETRIES = Counter("openskills_execution_retries_total", "Execution attempts that were retried", ("tool",))
+KERNEL_REPLACEMENTS = Counter("openskills_kernel_replacements_total", "Kernels removed from the pool for replacement", ("reason",))
+TIMEOUTS = Counter("openskills_timeouts_total", "Operations that timed out", ("tool", "kind"))
+HEALTH_CHECK_FAILURES = Counter("openskills_health_check_failures_total", "Kernel health checks that failed")
+SKILL_FILE_CACHE_REQUESTS = Counter("openskills_skill_file_cache_requests_total",
+                                    "Skill file reads by whether the cache had them", ("result",))
+KERNEL_INTERRUPTS = Counter("openskills_kernel_interrupts_total",
+                            "Executions stopped after a timeout or cancellation", ("outcome",))
+
+def instrumented_tool(fn):
+    """Record the duration and outcome of an MCP tool in TOOL_DURATION"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            # Tools report failures as "Error: ..." strings
+            outcome = "error" if isinstance(result, str) and result.startswith("Error") else "ok"
+            return result
+        finally:
+            TOOL_DURATION.observe(time.perf_counter() - start_time, tool=fn.__name__, outcome=outcome)
+    return wrapper
+
+def render_metrics() -> str:
+    """Render all metrics plus current pool and scheduler gauges in the Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    states: Dict[str, int] = {state.value: 0 for state in KernelState}
+    backend_kernels: Dict[str, int] = {name: 0 for name in kernel_pool.backends}
+    rss_mb = 0.0
+    for kernel_info in list(kernel_pool.kernels.values()):
+        states[kernel_info.state.value] += 1
+        rss_mb += kernel_info.memory_rss_mb() or 0.0
+        backend_kernels[kernel_info.backend.name] = backend_kernels.get(kernel_info.backend.name, 0) + 1
+    backends = list(kernel_pool.backends.values())
+    gauges = [
+        ("openskills_kernels", "Kernels in the pool by state",
+         [(f'{{state="{state}"}}', count) for state, count in states.items()]),
+        ("openskills_kernels_pending", "Kernels being created", [("", kernel_pool._pending_creations)]),
+        ("openskills_kernel_queue_depth", "Requests waiting for a kernel", [("", kernel_pool.queue_depth)]),
+        ("openskills_sticky_sessions", "Sessions pinned to a kernel", [("", len(kernel_pool.sessions))]),
+        ("openskills_skill_file_cache_chars", "Characters of skill files in the cache", [("", skill_file_cache.size)]),
+        ("openskills_kernels_resident_memory_bytes", "Resident memory of the kernels running on this machine",
+         [("", int(rss_mb * 1024 * 1024))]),
+        ("openskills_backend_kernels", "Kernels per Jupyter backend",
+         [(f'{{backend="{_escape_label_value(name)}"}}', count) for name, count in backend_kernels.items()]),
+        ("openskills_backend_up", "Whether a Jupyter backend is reachable",
+         [(f'{{backend="{_escape_label_value(b.name)}"}}', int(b.reachable)) for b in backends]),
+        ("openskills_backend_draining", "Whether a Jupyter backend is being drained",
+         [(f'{{backend="{_escape_label_value(b.name)}"}}', int(b.draining)) for b in backends]),
+        ("openskills_executions_queued", "Executions waiting for admission",
+         [(f'{{priority="{name}"}}', count) for name, count in execution_scheduler.queued.items()]),
+        ("openskills_executions_running", "Admitted executions",
+         [(f'{{priority="{name}"}}', count) for name, count in execution_scheduler.running.items()]),
+        ("openskills_admission_clients", "Clients with queued or admitted executions",
+         [("", len({client_id for client_id, _ in execution_scheduler._clients}))]),
+    ]
+    for name, documentation, samples in gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+def _add_worker_label(text: str) -> str:
+    """Label every sample of a rendered exposition with this worker's ID"""
+    label = f'worker="{WORKER_ID}"'
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            if series.endswith("}"):
+                line = f"{series[:-1]},{label}}} {value}"
+            else:
+                line = f"{series}{{{label}}} {value}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+def export_worker_metrics():
+    """Write this worker's metrics to METRICS_DIR for the other workers to serve"""
+    METRICS_DIR.mkdir(exist_ok=True)
+    path = METRICS_DIR / f"{WORKER_ID}.prom"
+    staging = path.with_suffix(".tmp")
+    staging.write_text(_add_worker_label(render_metrics()))
+    os.replace(staging, path)
+
+def render_worker_metrics() -> str:
+    """Merge the latest metrics of all live workers, grouping samples by metric family"""
+    export_worker_metrics()
+    families: Dict[str, list] = {}
+    cutoff = time.time() - 3 * METRICS_EXPORT_INTERVAL
+    for path in sorted(METRICS_DIR.glob("*.prom")):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                continue
+            text = path.read_text()
+        except OSError:
+            continue  # removed by another worker meanwhile
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                family = families.setdefault(line.split(" ", 3)[2], [line])
+            elif line.startswith("# TYPE "):
+                if len(family) == 1:
+                    family.append(line)
+            elif line and family is not None:
+                family.append(line)
+    return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+async def _metrics_export_loop():
+    """Background task that keeps this worker's exported metrics fresh"""
+    while True:
+        try:
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+            export_worker_metrics()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error exporting worker metrics: {e}")
+
 # --- KERNEL MANAGEMENT CLASSES ---
 
 class KernelState(Enum):
@@ -94,118 +485,960 @@ class KernelState(Enum):
     UNRESPONSIVE = "unresponsive"
     FAILED = "failed"
 
+class KernelChannel:
+    """
+    Long-lived WebSocket connection to a kernel's /channels endpoint.
+
+    A background reader task demultiplexes incoming messages by
+    parent_header.msg_id into per-request queues, so executions and health
+    checks share one connection and one Jupyter session instead of paying a
+    new handshake on every call. If the connection drops, pending requests
+    are woken with the error and the next request reconnects.
+    """
+
+    def __init__(self, kernel_id: str, ws_url: str):
+        self.kernel_id = kernel_id
+        self.session_id = uuid.uuid4().hex
+        self.url = f"{ws_url}/api/kernels/{kernel_id}/channels?session_id={self.session_id}"
+        self._ws = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self._pending: Dict[str, asyncio.Queue] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and self._reader_task is not None and not self._reader_task.done()
+
+    async def _ensure_connected(self):
+        """Return the open connection, (re)connecting if necessary"""
+        async with self._connect_lock:
+            if not self.connected:
+                connect_start = time.perf_counter()
+                ws = await websockets.connect(
+                    self.url,
+                    ping_interval=WEBSOCKET_PING_INTERVAL,
+                    ping_timeout=WEBSOCKET_PING_TIMEOUT,
+                    close_timeout=10,
+                    max_size=WEBSOCKET_MAX_MESSAGE_SIZE
+                )
+                WEBSOCKET_CONNECT_DURATION.observe(time.perf_counter() - connect_start)
+                self._ws = ws
+                self._reader_task = asyncio.create_task(self._reader_loop(ws))
+                logger.info(f"Opened channel connection to kernel {self.kernel_id}")
+            return self._ws
+
+    async def _reader_loop(self, ws):
+        """Route every incoming message to the queue of the request it answers"""
+        try:
+            while True:
+                message_str = await ws.recv()
+                if not self._may_be_pending_reply(message_str):
+                    # Other sessions' iopub traffic, late status messages etc.
+                    continue
+                try:
+                    message_data = json_loads(message_str)
+                except json.JSONDecodeError:
+                    logger.warning(f"Received invalid JSON from kernel {self.kernel_id}")
+                    continue
+
+                parent_msg_id = message_data.get("parent_header", {}).get("msg_id")
+                queue = self._pending.get(parent_msg_id)
+                if queue is not None:
+                    queue.put_nowait(message_data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self._ws is ws:
+                self._ws = None
+            logger.warning(f"Channel connection to kernel {self.kernel_id} lost: {e}")
+            # Wake up every request that was waiting on this connection
+            for queue in self._pending.values():
+                queue.put_nowait(e)
+
+    async def connect(self):
+        """Open the connection ahead of a request (no-op if already connected)"""
+        await self._ensure_connected()
+
+    def _may_be_pending_reply(self, message) -> bool:
+        """
+        Cheap pre-filter before decoding: a reply contains the msg_id of its
+        request (in parent_header), so a message containing none of the
+        pending msg_ids cannot be routed anywhere.
+        """
+        if not self._pending:
+            return False
+        if isinstance(message, bytes):
+            return any(msg_id.encode() in message for msg_id in self._pending)
+        for msg_id in self._pending:
+            if msg_id in message:
+                return True
+        return False
+
+    @contextlib.asynccontextmanager
+    async def request(self, msg_id: str, payload: str):
+        """
+        Send a message and yield the queue that receives its replies.
+        The queue is unregistered when the context exits.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[msg_id] = queue
+        try:
+            ws = await self._ensure_connected()
+            await ws.send(payload)
+            yield queue
+        finally:
+            self._pending.pop(msg_id, None)
+
+    @staticmethod
+    async def receive(queue: asyncio.Queue, timeout: float) -> dict:
+        """Wait for the next reply, re-raising connection errors from the reader"""
+        item = await asyncio.wait_for(queue.get(), timeout=timeout)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def close(self):
+        """Close the connection and stop the reader task"""
+        ws, reader = self._ws, self._reader_task
+        self._ws = None
+        self._reader_task = None
+        if reader is not None:
+            reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await reader
+        if ws is not None:
+            with contextlib.suppress(Exception):
+                await ws.close()
+
+@dataclass
+class JupyterBackend:
+    """
+    A Jupyter server that kernels are placed on.
+
+    Reachability is tracked here, separately from the health of its kernels:
+    an unreachable backend gets no new kernels, and those of its kernels
+    without an open channel are not handed out but are kept until it has
+    been down for JUPYTER_BACKEND_RETIRE_AFTER. A draining backend gets no
+    new kernels and its kernels are retired as soon as they are idle.
+    """
+    name: str
+    http_url: str
+    ws_url: str
+    weight: float = 1.0
+    max_kernels: Optional[int] = None
+    draining: bool = False
+    reachable: bool = True
+    unreachable_since: Optional[datetime] = None
+    pending_creations: int = 0
+    _http_client: Optional[httpx.AsyncClient] = field(default=None, init=False, repr=False)
+
+    @property
+    def local(self) -> bool:
+        """Whether kernel processes run on this machine (so their memory can be read)"""
+        return urlparse(self.http_url).hostname in ("127.0.0.1", "localhost", "::1")
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Server-lifetime HTTP client shared by all REST calls to this backend"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.http_url,
+                limits=httpx.Limits(
+                    max_connections=JUPYTER_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=JUPYTER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=JUPYTER_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(JUPYTER_HTTP_TIMEOUT, connect=JUPYTER_HTTP_CONNECT_TIMEOUT),
+            )
+        return self._http_client
+
+    def accepts_kernels(self) -> bool:
+        return self.reachable and not self.draining
+
+    def mark_reachable(self, reachable: bool):
+        if reachable and not self.reachable:
+            logger.info(f"Jupyter backend {self.name} is reachable again")
+            self.reachable = True
+            self.unreachable_since = None
+        elif not reachable and self.reachable:
+            logger.warning(f"Jupyter backend {self.name} is unreachable")
+            self.reachable = False
+            self.unreachable_since = datetime.now()
+
+    async def check(self) -> bool:
+        """Probe the server's /api/status endpoint and record the result"""
+        try:
+            response = await self.http_client.get(
+                "/api/status",
+                timeout=httpx.Timeout(KERNEL_HEALTH_CHECK_TIMEOUT, connect=JUPYTER_HTTP_CONNECT_TIMEOUT)
+            )
+            reachable = response.status_code == 200
+        except Exception as e:
+            logger.warning(f"Error checking Jupyter backend {self.name}: {e}")
+            reachable = False
+        self.mark_reachable(reachable)
+        return reachable
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+def load_jupyter_backends() -> Dict[str, JupyterBackend]:
+    """Build the configured backends, in configuration order"""
+    configs = JUPYTER_BACKENDS or [{"name": "default", "http_url": JUPYTER_HTTP_URL, "ws_url": JUPYTER_WS_URL}]
+    backends = {}
+    for config in configs:
+        backend = JupyterBackend(
+            name=config["name"],
+            http_url=config["http_url"].rstrip("/"),
+            ws_url=config["ws_url"].rstrip("/"),
+            weight=float(config.get("weight", 1.0)),
+            max_kernels=config.get("max_kernels"),
+        )
+        backends[backend.name] = backend
+    return backends
+
 @dataclass
 class KernelInfo:
     kernel_id: str
+    backend: JupyterBackend
     state: KernelState = KernelState.HEALTHY
     last_used: datetime = field(default_factory=datetime.now)
     last_health_check: datetime = field(default_factory=datetime.now)
     current_operation: Optional[str] = None
     failure_count: int = 0
+    warmup_seconds: Optional[float] = None
+    pid: Optional[int] = None
+    session_key: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    execution_count: int = 0
+    recycle_reason: Optional[str] = None  # set once a recycling threshold was crossed
+    channel: KernelChannel = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.channel = KernelChannel(self.kernel_id, self.backend.ws_url)
 
     def is_available(self) -> bool:
         return self.state == KernelState.HEALTHY
 
+    def memory_rss_mb(self) -> Optional[float]:
+        """Resident memory of the kernel process, if it runs on this machine"""
+        if self.pid is None or not self.backend.local:
+            return None
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    def recycle_due(self) -> Optional[str]:
+        """The first KERNEL_RECYCLE_* threshold the kernel has crossed, if any"""
+        if KERNEL_RECYCLE_MAX_EXECUTIONS is not None and self.execution_count >= KERNEL_RECYCLE_MAX_EXECUTIONS:
+            return "max_executions"
+        if KERNEL_RECYCLE_MAX_AGE is not None and \
+                datetime.now() - self.created_at > timedelta(seconds=KERNEL_RECYCLE_MAX_AGE):
+            return "max_age"
+        if KERNEL_RECYCLE_MAX_RSS_MB is not None and (self.memory_rss_mb() or 0.0) > KERNEL_RECYCLE_MAX_RSS_MB:
+            return "max_rss"
+        return None
+
     def needs_health_check(self) -> bool:
         return datetime.now() - self.last_health_check > timedelta(seconds=KERNEL_HEALTH_CHECK_INTERVAL)
 
+class PoolCoordinator:
+    """
+    Shares one set of kernels between server processes through SQLite.
+
+    Every worker keeps its own KernelPool view of the kernels registered in
+    the database and must hold a lease on a kernel while it uses it. A
+    kernel's session pin is stored with it, so sticky sessions work from any
+    worker. Kernel creation reserves a slot first, which keeps MAX_KERNELS a
+    limit across all workers. Calls are short local transactions and run
+    synchronously on the event loop.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kernels (
+            kernel_id TEXT PRIMARY KEY,
+            backend TEXT,
+            pid INTEGER,
+            session_key TEXT UNIQUE,
+            last_used REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS leases (
+            kernel_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS reservations (
+            reservation_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS draining_backends (
+            name TEXT PRIMARY KEY
+        );
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.worker_id = WORKER_ID
+        self._db = sqlite3.connect(path, timeout=POOL_DB_BUSY_TIMEOUT, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        with contextlib.suppress(sqlite3.OperationalError):
+            # Databases created before kernels were placed on several backends
+            self._db.execute("ALTER TABLE kernels ADD COLUMN backend TEXT")
+        logger.info(f"Coordinating kernel pool through {path} as worker {self.worker_id}")
+
+    @contextlib.contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        # Writers take the write lock up front so two workers can't both read
+        # and then fail to upgrade; readers use DEFERRED and never block them
+        self._db.execute(f"BEGIN {mode}")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def register_kernel(self, kernel_id: str, backend: str, pid: Optional[int] = None):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO kernels (kernel_id, backend, last_used) VALUES (?, ?, ?)",
+                (kernel_id, backend, time.time()),
+            )
+            if pid is not None:
+                db.execute("UPDATE kernels SET pid = ? WHERE kernel_id = ?", (pid, kernel_id))
+
+    def unregister_kernel(self, kernel_id: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM kernels WHERE kernel_id = ?", (kernel_id,))
+            db.execute("DELETE FROM leases WHERE kernel_id = ?", (kernel_id,))
+
+    def try_lease(self, kernel_id: str, session_key: Optional[str] = None) -> bool:
+        """
+        Lease a kernel for this worker, pinning it to session_key if given.
+        Fails if another worker holds a live lease, the kernel was removed, or
+        the session is already pinned to another kernel.
+        """
+        now = time.time()
+        try:
+            with self._transaction() as db:
+                lease = db.execute(
+                    "SELECT worker_id, expires_at FROM leases WHERE kernel_id = ?", (kernel_id,)
+                ).fetchone()
+                if lease is not None and lease[0] != self.worker_id and lease[1] > now:
+                    return False
+                if session_key is not None:
+                    updated = db.execute(
+                        "UPDATE kernels SET session_key = ?, last_used = ? WHERE kernel_id = ?",
+                        (session_key, now, kernel_id),
+                    )
+                else:
+                    updated = db.execute("UPDATE kernels SET last_used = ? WHERE kernel_id = ?", (now, kernel_id))
+                if updated.rowcount == 0:
+                    return False
+                db.execute(
+                    "INSERT OR REPLACE INTO leases (kernel_id, worker_id, expires_at) VALUES (?, ?, ?)",
+                    (kernel_id, self.worker_id, now + POOL_LEASE_TTL),
+                )
+                return True
+        except sqlite3.IntegrityError:
+            # The session was pinned to another kernel by another worker
+            return False
+
+    def release(self, kernel_id: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM leases WHERE kernel_id = ? AND worker_id = ?", (kernel_id, self.worker_id))
+
+    def set_session(self, kernel_id: str, session_key: Optional[str]):
+        with self._transaction() as db:
+            db.execute("UPDATE kernels SET session_key = ? WHERE kernel_id = ?", (session_key, kernel_id))
+
+    def reserve_creation(self) -> Optional[str]:
+        """Reserve a slot for a new kernel, or return None if the shared pool is at MAX_KERNELS"""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM reservations WHERE expires_at <= ?", (now,))
+            kernels = db.execute("SELECT COUNT(*) FROM kernels").fetchone()[0]
+            reserved = db.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+            if kernels + reserved >= MAX_KERNELS:
+                return None
+            reservation_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO reservations (reservation_id, worker_id, expires_at) VALUES (?, ?, ?)",
+                (reservation_id, self.worker_id, now + POOL_LEASE_TTL),
+            )
+            return reservation_id
+
+    def complete_reservation(self, reservation_id: str, kernel_info: Optional["KernelInfo"] = None):
+        """Drop a reservation, registering the kernel that was created for it if any"""
+        with self._transaction() as db:
+            db.execute("DELETE FROM reservations WHERE reservation_id = ?", (reservation_id,))
+            if kernel_info is not None:
+                db.execute(
+                    "INSERT OR IGNORE INTO kernels (kernel_id, backend, pid, last_used) VALUES (?, ?, ?, ?)",
+                    (kernel_info.kernel_id, kernel_info.backend.name, kernel_info.pid, time.time()),
+                )
+
+    def set_draining(self, backend: str, draining: bool):
+        with self._transaction() as db:
+            if draining:
+                db.execute("INSERT OR IGNORE INTO draining_backends (name) VALUES (?)", (backend,))
+            else:
+                db.execute("DELETE FROM draining_backends WHERE name = ?", (backend,))
+
+    def renew(self, kernel_ids: Set[str], reservation_ids: Set[str]):
+        """
+        Extend this worker's leases on kernel_ids and its reservations in
+        reservation_ids, dropping any others it still holds (left behind by a
+        release or completion that failed)
+        """
+        expires_at = time.time() + POOL_LEASE_TTL
+        with self._transaction() as db:
+            for table, key, keep in (("leases", "kernel_id", kernel_ids), ("reservations", "reservation_id", reservation_ids)):
+                held = {row_id for (row_id,) in db.execute(f"SELECT {key} FROM {table} WHERE worker_id = ?", (self.worker_id,))}
+                db.executemany(f"DELETE FROM {table} WHERE {key} = ?", ((row_id,) for row_id in held - keep))
+                db.execute(f"UPDATE {table} SET expires_at = ? WHERE worker_id = ?", (expires_at, self.worker_id))
+
+    def snapshot(self) -> tuple[Dict[str, tuple], Set[str], Set[str]]:
+        """
+        Registered kernels as kernel_id -> (backend, pid, session_key, last_used),
+        the kernels other workers hold live leases on, and the draining backends
+        """
+        with self._transaction("DEFERRED") as db:
+            kernels = {
+                kernel_id: (backend, pid, session_key, last_used)
+                for kernel_id, backend, pid, session_key, last_used
+                in db.execute("SELECT kernel_id, backend, pid, session_key, last_used FROM kernels")
+            }
+            draining = {name for (name,) in db.execute("SELECT name FROM draining_backends")}
+            leased = {
+                kernel_id for (kernel_id,) in db.execute(
+                    "SELECT kernel_id FROM leases WHERE worker_id != ? AND expires_at > ?",
+                    (self.worker_id, time.time()),
+                )
+            }
+        return kernels, leased, draining
+
+    def close(self):
+        """Give up this worker's leases and reservations"""
+        with contextlib.suppress(sqlite3.Error):
+            with self._transaction() as db:
+                db.execute("DELETE FROM leases WHERE worker_id = ?", (self.worker_id,))
+                db.execute("DELETE FROM reservations WHERE worker_id = ?", (self.worker_id,))
+        self._db.close()
+
 class KernelPool:
     def __init__(self):
         self.kernels: Dict[str, KernelInfo] = {}
         self.lock = asyncio.Lock()
         self.busy_kernels: Set[str] = set()
         self._initialized = False
+        self._init_lock = asyncio.Lock()
         self._health_check_task: Optional[asyncio.Task] = None
+        # Jupyter servers kernels are placed on, loaded on initialization
+        self.backends: Dict[str, JupyterBackend] = {}
+        # Sticky sessions: session key -> pinned kernel ID, least recently used first
+        self.sessions: "OrderedDict[str, str]" = OrderedDict()
+        # Requests waiting for a kernel: heap of (priority, arrival order, future, session key)
+        self._waiters: list = []
+        self._waiter_seq = itertools.count()
+        # Kernel creation and removal happen in background tasks, never under self.lock
+        self._replenish_task: Optional[asyncio.Task] = None
+        self._replenish_event = asyncio.Event()
+        self._pending_creations = 0
+        self._background_tasks: Set[asyncio.Task] = set()
+        # Shared pool state when several workers use the same kernels
+        self.coordinator: Optional[PoolCoordinator] = None
+        self._coordination_task: Optional[asyncio.Task] = None
+        self._leased_elsewhere: Set[str] = set()
+        # Creation reservations in flight, and kernels whose registration failed (retried on sync)
+        self._reservations: Set[str] = set()
+        self._unregistered_kernels: Set[str] = set()
 
     async def initialize(self):
-        """Initialize the kernel pool with minimum number of kernels"""
+        """Initialize the kernel pool and start filling it to the minimum size"""
         if self._initialized:
             return
 
-        async with self.lock:
+        async with self._init_lock:
+            if self._initialized:
+                return
             logger.info("Initializing kernel pool...")
+            self.backends = load_jupyter_backends()
+            if POOL_COORDINATION_ENABLED:
+                self.coordinator = PoolCoordinator(POOL_COORDINATION_DB)
 
             # Try to use existing kernel first
             existing_kernel = await self._get_existing_kernel()
+            if existing_kernel and not await self._warm_up_kernel(existing_kernel):
+                await existing_kernel.channel.close()
+                existing_kernel = None
             if existing_kernel:
-                self.kernels[existing_kernel] = KernelInfo(kernel_id=existing_kernel)
-                logger.info(f"Added existing kernel to pool: {existing_kernel}")
-
-            # Create additional kernels to reach minimum
-            while len(self.kernels) < MIN_KERNELS:
-                kernel_id = await self._create_new_kernel()
-                if kernel_id:
-                    self.kernels[kernel_id] = KernelInfo(kernel_id=kernel_id)
-                    logger.info(f"Created new kernel: {kernel_id}")
-                else:
-                    logger.warning("Failed to create minimum number of kernels")
-                    break
+                async with self.lock:
+                    self.kernels[existing_kernel.kernel_id] = existing_kernel
+                    if self.coordinator:
+                        self.coordinator.register_kernel(
+                            existing_kernel.kernel_id, existing_kernel.backend.name, existing_kernel.pid
+                        )
+                logger.info(f"Added existing kernel to pool: {existing_kernel.kernel_id}")
+
+            if self.coordinator:
+                # Pick up the kernels other workers already created
+                await self._sync_with_coordinator()
+                self._coordination_task = asyncio.create_task(self._coordination_loop())
 
             self._initialized = True
-            # Start health check background task
+            # Start background tasks: the replenisher creates the remaining kernels
+            self._replenish_task = asyncio.create_task(self._replenish_loop())
             self._health_check_task = asyncio.create_task(self._health_check_loop())
-            logger.info(f"Kernel pool initialized with {len(self.kernels)} kernels")
-
-    async def get_available_kernel(self) -> Optional[str]:
-        """Get an available kernel from the pool"""
+            self._request_replenish()
+            logger.info(f"Kernel pool initialized with {len(self.kernels)} kernels, replenishing to {MIN_KERNELS}")
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting for a kernel"""
+        return len(self._waiters)
+
+    async def get_available_kernel(self, priority: int = 0, timeout: Optional[float] = None,
+                                   session_key: Optional[str] = None) -> str:
+        """
+        Get an available kernel from the pool, waiting in line if all kernels are busy.
+
+        Waiters are served in order of priority (lower first), then arrival.
+        With a session_key the request is pinned to the kernel that served the
+        session before, so variables survive between calls of one conversation.
+        Raises KernelPoolSaturatedError if the wait queue is full and
+        NoKernelAvailableError if no kernel is handed over within the timeout.
+        """
         if not self._initialized:
             await self.initialize()
+        if timeout is None:
+            timeout = KERNEL_ACQUIRE_TIMEOUT
 
         async with self.lock:
-            # Find healthy, available kernel
-            for kernel_id, kernel_info in self.kernels.items():
-                if kernel_info.is_available() and kernel_id not in self.busy_kernels:
-                    self.busy_kernels.add(kernel_id)
-                    kernel_info.state = KernelState.BUSY
-                    kernel_info.last_used = datetime.now()
-                    logger.info(f"Assigned kernel {kernel_id} to operation")
-                    return kernel_id
-
-            # No available kernels, try to create a new one if under limit
-            if len(self.kernels) < MAX_KERNELS:
-                kernel_id = await self._create_new_kernel()
-                if kernel_id:
-                    kernel_info = KernelInfo(kernel_id=kernel_id, state=KernelState.BUSY)
-                    self.kernels[kernel_id] = kernel_info
-                    self.busy_kernels.add(kernel_id)
-                    logger.info(f"Created and assigned new kernel: {kernel_id}")
-                    return kernel_id
+            # Waiters that could be served already have been, so this never jumps the queue
+            kernel_info = self._select_kernel(session_key)
+            if kernel_info:
+                self._assign_kernel(kernel_info, session_key)
+                logger.info(f"Assigned kernel {kernel_info.kernel_id} to operation")
+                # Top up the warm idle kernels in the background
+                self._request_replenish()
+                return kernel_info.kernel_id
+
+            # Shed load once the pool cannot grow any further and the queue is full
+            if len(self.kernels) >= MAX_KERNELS and len(self._waiters) >= KERNEL_WAIT_QUEUE_MAX:
+                logger.warning(f"Kernel wait queue full ({len(self._waiters)} waiting), rejecting request")
+                raise KernelPoolSaturatedError(
+                    f"Server is at capacity: all {len(self.kernels)} kernels are busy and "
+                    f"{len(self._waiters)} requests are already waiting. Please retry later."
+                )
 
-            logger.warning("No available kernels in pool")
-            return None
+            waiter = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._waiter_seq), waiter, session_key)
+            heapq.heappush(self._waiters, entry)
+            logger.info(f"All kernels busy, queued request (position {len(self._waiters)})")
+            # A new kernel is created in the background if the pool is under MAX_KERNELS
+            self._request_replenish()
+
+        try:
+            return await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            # The kernel may have been handed over just as the deadline expired
+            if waiter.done() and not waiter.cancelled():
+                return waiter.result()
+            raise NoKernelAvailableError(f"No kernel became available within {timeout:.0f} seconds")
+        except asyncio.CancelledError:
+            # Since Python 3.12 wait_for drops a result that arrived just before
+            # the cancellation, give the kernel back instead of leaking it
+            if waiter.done() and not waiter.cancelled():
+                logger.info(f"Request was cancelled after kernel {waiter.result()} was handed to it, releasing it")
+                self._run_in_background(self.release_kernel(waiter.result()))
+            raise
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
 
     async def release_kernel(self, kernel_id: str, failed: bool = False):
-        """Release a kernel back to the pool"""
+        """Release a kernel back to the pool, handing it to the next waiter if any"""
         async with self.lock:
-            if kernel_id in self.busy_kernels:
-                self.busy_kernels.remove(kernel_id)
+            released = kernel_id in self.busy_kernels
+            self.busy_kernels.discard(kernel_id)
 
             if kernel_id in self.kernels:
                 kernel_info = self.kernels[kernel_id]
+                kernel_info.execution_count += 1
                 if failed:
                     kernel_info.failure_count += 1
                     kernel_info.state = KernelState.FAILED
                     logger.warning(f"Kernel {kernel_id} marked as failed (failures: {kernel_info.failure_count})")
+                    # Don't keep the session waiting on a kernel that is out of rotation
+                    self._unpin_kernel(kernel_info)
 
-                    # Remove failed kernel if it has too many failures
+                    # Remove failed kernel if it has too many failures (replaced in the background)
                     if kernel_info.failure_count >= MAX_RETRY_ATTEMPTS:
-                        await self._remove_kernel(kernel_id)
-                        # Create replacement kernel
-                        new_kernel_id = await self._create_new_kernel()
-                        if new_kernel_id:
-                            self.kernels[new_kernel_id] = KernelInfo(kernel_id=new_kernel_id)
+                        self._retire_kernel(kernel_id, reason="failed")
                 else:
                     kernel_info.state = KernelState.HEALTHY
                     kernel_info.current_operation = None
+                    # A successful execution proves the kernel is healthy, skip the next probe
+                    kernel_info.last_health_check = datetime.now()
                     logger.info(f"Released kernel {kernel_id} back to pool")
+                    if kernel_info.backend.draining:
+                        logger.info(f"Retiring kernel {kernel_id} of draining backend {kernel_info.backend.name}")
+                        self._retire_kernel(kernel_id, reason="drain")
+                    else:
+                        if kernel_info.session_key is not None:
+                            self._enforce_session_memory_limit()
+                        self._recycle_kernels([kernel_info])
+
+            self._dispatch_waiters()
+            # A kernel handed straight to a queued request keeps its (renewed) lease
+            if released and self.coordinator and kernel_id not in self.busy_kernels:
+                try:
+                    self.coordinator.release(kernel_id)
+                except sqlite3.Error as e:
+                    # The next renewal drops the lease instead
+                    logger.warning(f"Could not release the lease on kernel {kernel_id}: {e}")
+
+    def _is_idle(self, kernel_info: KernelInfo) -> bool:
+        backend = kernel_info.backend
+        return (
+            kernel_info.is_available()
+            and not backend.draining
+            # A kernel with an open channel still works while its backend's REST API is down
+            and (backend.reachable or kernel_info.channel.connected)
+            and kernel_info.kernel_id not in self.busy_kernels
+            and kernel_info.kernel_id not in self._leased_elsewhere
+        )
+
+    def _find_idle_kernel(self) -> Optional[KernelInfo]:
+        """Find an idle kernel that is not pinned to a session"""
+        for kernel_info in self.kernels.values():
+            if kernel_info.session_key is None and self._is_idle(kernel_info):
+                return kernel_info
+        return None
+
+    def _select_kernel(self, session_key: Optional[str]) -> Optional[KernelInfo]:
+        """Pick the kernel a request should run on, or None if it has to wait (call with the lock held)"""
+        while True:
+            kernel_info = self._pick_kernel(session_key)
+            if kernel_info is None or self._try_lease(kernel_info, session_key):
+                return kernel_info
+            # Another worker got there first, skip the kernel until the next sync
+            self._leased_elsewhere.add(kernel_info.kernel_id)
+
+    def _try_lease(self, kernel_info: KernelInfo, session_key: Optional[str]) -> bool:
+        """Take the shared lease on a kernel before using it (always succeeds with a single worker)"""
+        if self.coordinator is None:
+            return True
+        try:
+            return self.coordinator.try_lease(kernel_info.kernel_id, session_key)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not lease kernel {kernel_info.kernel_id}: {e}")
+            return False
+
+    def _pick_kernel(self, session_key: Optional[str]) -> Optional[KernelInfo]:
+        if session_key is not None and session_key in self.sessions:
+            kernel_info = self.kernels.get(self.sessions[session_key])
+            if kernel_info is not None:
+                # Wait for the session's own kernel even if others are free
+                return kernel_info if self._is_idle(kernel_info) else None
+            # The pinned kernel is gone, the session continues on a fresh one
+            logger.warning(f"Kernel of session {session_key} was removed, its state is lost")
+            del self.sessions[session_key]
+
+        kernel_info = self._find_idle_kernel()
+        if kernel_info is None and len(self.kernels) + self._pending_creations >= MAX_KERNELS:
+            # The pool cannot grow, take over the least recently used idle session's kernel
+            kernel_info = self._evict_lru_session()
+        return kernel_info
+
+    def _assign_kernel(self, kernel_info: KernelInfo, session_key: Optional[str] = None):
+        self.busy_kernels.add(kernel_info.kernel_id)
+        kernel_info.state = KernelState.BUSY
+        kernel_info.last_used = datetime.now()
+        if session_key is not None:
+            if kernel_info.session_key != session_key:
+                kernel_info.session_key = session_key
+                self.sessions[session_key] = kernel_info.kernel_id
+                logger.info(f"Pinned session {session_key} to kernel {kernel_info.kernel_id}")
+            self.sessions.move_to_end(session_key)
+
+    def _unpin_kernel(self, kernel_info: KernelInfo):
+        if kernel_info.session_key is not None:
+            self.sessions.pop(kernel_info.session_key, None)
+            kernel_info.session_key = None
+            if self.coordinator:
+                with contextlib.suppress(sqlite3.Error):
+                    self.coordinator.set_session(kernel_info.kernel_id, None)
+
+    def _evict_lru_session(self) -> Optional[KernelInfo]:
+        """Unpin the idle kernel of the least recently used session (call with the lock held)"""
+        for session_key, kernel_id in self.sessions.items():
+            kernel_info = self.kernels.get(kernel_id)
+            if kernel_info is not None and self._is_idle(kernel_info):
+                logger.info(f"Evicted session {session_key} from kernel {kernel_id}")
+                self._unpin_kernel(kernel_info)
+                return kernel_info
+        return None
 
-    async def _get_existing_kernel(self) -> Optional[str]:
+    def _expire_sessions(self):
+        """Unpin sessions that have been idle longer than STICKY_SESSION_IDLE_TIMEOUT (call with the lock held)"""
+        cutoff = datetime.now() - timedelta(seconds=STICKY_SESSION_IDLE_TIMEOUT)
+        for kernel_id in list(self.sessions.values()):
+            kernel_info = self.kernels.get(kernel_id)
+            if kernel_info is not None and self._is_idle(kernel_info) and kernel_info.last_used < cutoff:
+                logger.info(f"Session {kernel_info.session_key} expired, unpinning kernel {kernel_id}")
+                self._unpin_kernel(kernel_info)
+
+    def _enforce_session_memory_limit(self):
+        """
+        Recycle the kernels of least recently used idle sessions while pinned
+        kernels use more than STICKY_SESSIONS_MAX_RSS_MB (call with the lock held).
+        """
+        if STICKY_SESSIONS_MAX_RSS_MB is None:
+            return
+        usage = {
+            kernel_id: self.kernels[kernel_id].memory_rss_mb() or 0.0
+            for kernel_id in self.sessions.values() if kernel_id in self.kernels
+        }
+        total = sum(usage.values())
+        for session_key, kernel_id in list(self.sessions.items()):
+            if total <= STICKY_SESSIONS_MAX_RSS_MB:
+                break
+            kernel_info = self.kernels.get(kernel_id)
+            if kernel_info is None or not self._is_idle(kernel_info):
+                continue
+            logger.warning(
+                f"Pinned kernels use {total:.0f} MB (limit {STICKY_SESSIONS_MAX_RSS_MB} MB), "
+                f"recycling kernel {kernel_id} of session {session_key}"
+            )
+            total -= usage.get(kernel_id, 0.0)
+            self._retire_kernel(kernel_id, reason="session_memory")
+
+    def _recycle_kernels(self, kernel_infos: Optional[list] = None):
+        """
+        Recycle idle kernels that crossed a KERNEL_RECYCLE_* threshold (call with the lock held).
+
+        A kernel is retired only while a warm idle kernel can take its place.
+        Otherwise a replacement is started first and the kernel keeps serving
+        requests until it is ready, unless the pool is at MAX_KERNELS. Pinned
+        kernels are only recycled for memory, the other thresholds wait until
+        their session lets go of them.
+        """
+        for kernel_info in list(self.kernels.values()) if kernel_infos is None else kernel_infos:
+            if kernel_info.kernel_id not in self.kernels or not self._is_idle(kernel_info):
+                continue
+            reason = kernel_info.recycle_reason or kernel_info.recycle_due()
+            if reason is None or (kernel_info.session_key is not None and reason != "max_rss"):
+                continue
+            kernel_info.recycle_reason = reason
+            at_capacity = len(self.kernels) + self._pending_creations >= MAX_KERNELS
+            if self._count_idle_kernels() == 0 and not at_capacity:
+                if self._pending_creations == 0:
+                    logger.info(f"Kernel {kernel_info.kernel_id} is due for recycling ({reason}), warming up its replacement")
+                    self._pending_creations += 1
+                    self._run_in_background(self._spawn_kernel())
+                continue
+            # The lease makes sure no other worker is about to run code on it
+            if self._try_lease(kernel_info, None):
+                logger.info(
+                    f"Recycling kernel {kernel_info.kernel_id} ({reason}) after "
+                    f"{kernel_info.execution_count} executions"
+                )
+                if kernel_info.session_key is not None:
+                    logger.warning(f"Session {kernel_info.session_key} loses its variables to the recycling")
+                self._retire_kernel(kernel_info.kernel_id, reason=reason)
+
+    def _count_idle_kernels(self) -> int:
+        """Idle unpinned kernels that can take a new session, not counting kernels due for recycling"""
+        return sum(
+            1 for kernel_info in self.kernels.values()
+            if kernel_info.session_key is None and kernel_info.recycle_reason is None and self._is_idle(kernel_info)
+        )
+
+    def _dispatch_waiters(self):
+        """Hand idle kernels directly to queued requests (call with the lock held)"""
+        served = False
+        for entry in sorted(self._waiters):
+            _, _, waiter, session_key = entry
+            if not waiter.done():
+                kernel_info = self._select_kernel(session_key)
+                if kernel_info is None:
+                    continue
+                self._assign_kernel(kernel_info, session_key)
+                waiter.set_result(kernel_info.kernel_id)
+                logger.info(f"Handed kernel {kernel_info.kernel_id} to queued request")
+            self._waiters.remove(entry)
+            served = True
+        if served:
+            heapq.heapify(self._waiters)
+
+    async def _sync_with_coordinator(self):
+        """Refresh the local view of the shared pool: kernels, session pins and other workers' leases"""
+        async with self.lock:
+            for kernel_id in list(self._unregistered_kernels):
+                kernel_info = self.kernels[kernel_id]
+                with contextlib.suppress(sqlite3.Error):
+                    self.coordinator.register_kernel(kernel_id, kernel_info.backend.name, kernel_info.pid)
+                    self._unregistered_kernels.discard(kernel_id)
+            registered, leased_elsewhere, draining = self.coordinator.snapshot()
+            for backend in self.backends.values():
+                backend.draining = backend.name in draining
+            for kernel_id, (backend_name, pid, session_key, last_used) in registered.items():
+                kernel_info = self.kernels.get(kernel_id)
+                if kernel_info is None:
+                    # Created (and warmed up) by another worker
+                    backend = self.backends.get(backend_name) or self.default_backend
+                    kernel_info = self.kernels[kernel_id] = KernelInfo(kernel_id=kernel_id, backend=backend, pid=pid)
+                    logger.info(f"Added kernel {kernel_id} created by another worker")
+                kernel_info.last_used = max(kernel_info.last_used, datetime.fromtimestamp(last_used))
+                if kernel_id in self.busy_kernels or kernel_info.session_key == session_key:
+                    continue
+                if self.sessions.get(kernel_info.session_key) == kernel_id:
+                    del self.sessions[kernel_info.session_key]
+                kernel_info.session_key = session_key
+                if session_key is not None:
+                    self.sessions[session_key] = kernel_id
+
+            for kernel_id in list(self.kernels):
+                if (
+                    kernel_id not in registered and kernel_id not in self.busy_kernels
+                    and kernel_id not in self._unregistered_kernels
+                ):
+                    # Retired by another worker, which also shuts it down
+                    kernel_info = self.kernels.pop(kernel_id)
+                    if self.sessions.get(kernel_info.session_key) == kernel_id:
+                        del self.sessions[kernel_info.session_key]
+                    self._run_in_background(kernel_info.channel.close())
+
+            # Keep sessions in least recently used order across workers
+            self.sessions = OrderedDict(sorted(
+                ((session_key, kernel_id) for session_key, kernel_id in self.sessions.items() if kernel_id in self.kernels),
+                key=lambda item: self.kernels[item[1]].last_used,
+            ))
+            self._leased_elsewhere = leased_elsewhere
+            self._retire_draining_kernels()
+            # Kernels released by other workers can serve our queue now
+            self._dispatch_waiters()
+        self._request_replenish()
+
+    async def _coordination_loop(self):
+        """Background task that renews this worker's leases and refreshes the shared pool state"""
+        while True:
+            try:
+                await asyncio.sleep(POOL_SYNC_INTERVAL)
+                self.coordinator.renew(self.busy_kernels, self._reservations)
+                await self._sync_with_coordinator()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in pool coordination loop: {e}")
+
+    def get_channel(self, kernel_id: str) -> KernelChannel:
+        """Get the shared channel connection of a pooled kernel"""
+        kernel_info = self.kernels.get(kernel_id)
+        if kernel_info is None:
+            raise KernelError(f"Kernel {kernel_id} is not in the pool")
+        return kernel_info.channel
+
+    @property
+    def default_backend(self) -> JupyterBackend:
+        """The first configured backend, which also runs the kernel started by entrypoint.sh"""
+        if not self.backends:
+            self.backends = load_jupyter_backends()
+        return next(iter(self.backends.values()))
+
+    def _choose_backend(self) -> Optional[JupyterBackend]:
+        """Pick the backend for a new kernel by KERNEL_PLACEMENT_POLICY (call with the lock held)"""
+        load = {name: backend.pending_creations for name, backend in self.backends.items()}
+        for kernel_info in self.kernels.values():
+            load[kernel_info.backend.name] = load.get(kernel_info.backend.name, 0) + 1
+        candidates = [
+            backend for backend in self.backends.values()
+            if backend.accepts_kernels() and backend.weight > 0
+            and (backend.max_kernels is None or load[backend.name] < backend.max_kernels)
+        ]
+        if not candidates:
+            return None
+        if KERNEL_PLACEMENT_POLICY == "weighted":
+            return random.choices(candidates, weights=[backend.weight for backend in candidates])[0]
+        return min(candidates, key=lambda backend: load[backend.name] / backend.weight)
+
+    async def drain_backend(self, name: str, draining: bool = True) -> int:
+        """
+        Stop placing kernels on a backend and retire its kernels once they are
+        idle (running executions finish first), or undo that. Sessions pinned
+        to a retired kernel continue on a new one. Returns the number of
+        kernels retired right away. Raises KeyError for an unknown backend.
+        """
+        backend = self.backends[name]
+        async with self.lock:
+            backend.draining = draining
+            if self.coordinator:
+                self.coordinator.set_draining(name, draining)
+            logger.info(f"{'Draining' if draining else 'Stopped draining'} Jupyter backend {name}")
+            retired = self._retire_draining_kernels()
+            self._request_replenish()
+        return retired
+
+    def _retire_draining_kernels(self) -> int:
+        """Retire the idle kernels of draining backends (call with the lock held)"""
+        retired = 0
+        for kernel_info in list(self.kernels.values()):
+            if not kernel_info.backend.draining or kernel_info.kernel_id in self.busy_kernels:
+                continue
+            if kernel_info.kernel_id in self._leased_elsewhere:
+                continue
+            # The lease makes sure no other worker is about to run code on it
+            if self._try_lease(kernel_info, None):
+                if kernel_info.session_key is not None:
+                    logger.warning(f"Session {kernel_info.session_key} loses its kernel to the drain")
+                self._retire_kernel(kernel_info.kernel_id, reason="drain")
+                retired += 1
+        return retired
+
+    async def shutdown(self):
+        """Stop background tasks and close all kernel and HTTP connections"""
+        tasks = [self._health_check_task, self._replenish_task, self._coordination_task, *self._background_tasks]
+        for task in tasks:
+            if task:
+                task.cancel()
+        for task in tasks:
+            if task:
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await task
+        self._health_check_task = None
+        self._replenish_task = None
+        self._coordination_task = None
+        for kernel_info in list(self.kernels.values()):
+            await kernel_info.channel.close()
+        if self.coordinator is not None:
+            # The kernels stay registered for the other workers
+            self.coordinator.close()
+            self.coordinator = None
+        for backend in self.backends.values():
+            await backend.close()
+
+    async def _get_existing_kernel(self) -> Optional[KernelInfo]:
         """Try to get kernel ID from existing file"""
         try:
             async with aiofiles.open(KERNEL_ID_FILE_PATH, mode='r') as f:
                 kernel_id = (await f.read()).strip()
-                if kernel_id and await self._check_kernel_health(kernel_id):
-                    return kernel_id
+                if kernel_id:
+                    kernel_info = KernelInfo(kernel_id=kernel_id, backend=self.default_backend)
+                    if await self._check_kernel_health(kernel_info):
+                        return kernel_info
+                    await kernel_info.channel.close()
         except FileNotFoundError:
             # This is a normal case if the server is starting for the first time.
             pass
@@ -213,200 +1446,1018 @@ class KernelPool:
             logger.warning(f"Could not read or validate existing kernel from {KERNEL_ID_FILE_PATH}: {e}")
         return None
 
-    async def _create_new_kernel(self) -> Optional[str]:
-        """Create a new Jupyter kernel"""
+    async def _create_new_kernel(self, backend: JupyterBackend) -> Optional[str]:
+        """Create a new Jupyter kernel on a backend"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{JUPYTER_HTTP_URL}/api/kernels",
-                    json={"name": "python3"},
-                    timeout=30.0
-                )
-                if response.status_code == 201:
-                    kernel_data = response.json()
-                    kernel_id = kernel_data["id"]
-                    logger.info(f"Created new kernel: {kernel_id}")
-                    return kernel_id
-                else:
-                    logger.error(f"Failed to create kernel: {response.status_code}")
+            response = await backend.http_client.post(
+                "/api/kernels",
+                json={"name": "python3"}
+            )
+            if response.status_code == 201:
+                kernel_data = response.json()
+                kernel_id = kernel_data["id"]
+                logger.info(f"Created new kernel on backend {backend.name}: {kernel_id}")
+                return kernel_id
+            else:
+                logger.error(f"Failed to create kernel on backend {backend.name}: {response.status_code}")
+        except httpx.TimeoutException as e:
+            # A slow kernel start or a busy connection pool, not an outage
+            logger.error(f"Timed out creating kernel on backend {backend.name}: {e!r}")
+        except httpx.TransportError as e:
+            logger.error(f"Error creating kernel on backend {backend.name}: {e}")
+            # One failed request doesn't make the backend unreachable, ask it directly
+            await backend.check()
         except Exception as e:
-            logger.error(f"Error creating kernel: {e}")
+            logger.error(f"Error creating kernel on backend {backend.name}: {e}")
         return None
 
-    async def _remove_kernel(self, kernel_id: str):
-        """Remove and shutdown a kernel"""
+    async def interrupt_kernel(self, kernel_id: str) -> bool:
+        """Interrupt the code currently running on a kernel"""
+        kernel_info = self.kernels.get(kernel_id)
+        backend = kernel_info.backend if kernel_info else self.default_backend
         try:
-            async with httpx.AsyncClient() as client:
-                await client.delete(
-                    f"{JUPYTER_HTTP_URL}/api/kernels/{kernel_id}",
-                    timeout=10.0
-                )
+            response = await backend.http_client.post(f"/api/kernels/{kernel_id}/interrupt")
+            if response.status_code == 204:
+                logger.info(f"Interrupted kernel: {kernel_id}")
+                return True
+            logger.warning(f"Failed to interrupt kernel {kernel_id}: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Error interrupting kernel {kernel_id}: {e}")
+        return False
+
+    async def restart_kernel(self, kernel_id: str) -> bool:
+        """Restart a kernel process, which loses all its state"""
+        kernel_info = self.kernels.get(kernel_id)
+        backend = kernel_info.backend if kernel_info else self.default_backend
+        try:
+            response = await backend.http_client.post(
+                f"/api/kernels/{kernel_id}/restart",
+                timeout=httpx.Timeout(KERNEL_RESTART_TIMEOUT, connect=JUPYTER_HTTP_CONNECT_TIMEOUT)
+            )
+            if response.status_code == 200:
+                logger.info(f"Restarted kernel: {kernel_id}")
+                return True
+            logger.warning(f"Failed to restart kernel {kernel_id}: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Error restarting kernel {kernel_id}: {e}")
+        return False
+
+    async def stop_execution(self, kernel_id: str) -> Optional[str]:
+        """
+        Stop code that is still running on a kernel the caller holds.
+
+        Interrupts the kernel and waits until it answers a kernel_info_request,
+        which it only does once the interrupted code has stopped. If that
+        doesn't happen within KERNEL_INTERRUPT_TIMEOUT the kernel is restarted
+        (its session loses its variables). Returns "interrupted", "restarted",
+        or None if the kernel could not be recovered.
+        """
+        kernel_info = self.kernels.get(kernel_id)
+        if kernel_info is None:
+            return None
+        outcome = None
+        if await self.interrupt_kernel(kernel_id) and \
+                await self._check_kernel_health(kernel_info, timeout=KERNEL_INTERRUPT_TIMEOUT):
+            outcome = "interrupted"
+        else:
+            logger.warning(f"Interrupt did not stop kernel {kernel_id}, restarting it")
+            if await self.restart_kernel(kernel_id):
+                # Reconnect, the old connection may still be attached to the previous process
+                await kernel_info.channel.close()
+                if await self._check_kernel_health(kernel_info, timeout=KERNEL_RESTART_TIMEOUT) and \
+                        await self._warm_up_kernel(kernel_info):
+                    outcome = "restarted"
+                async with self.lock:
+                    if kernel_info.session_key is not None:
+                        logger.warning(f"Session {kernel_info.session_key} lost its variables to the restart")
+                        self._unpin_kernel(kernel_info)
+        KERNEL_INTERRUPTS.inc(outcome=outcome or "failed")
+        return outcome
+
+    async def list_remote_kernels(self, backend: Optional[JupyterBackend] = None) -> Optional[Dict[str, dict]]:
+        """
+        List the kernels known to a Jupyter backend (default: the first), keyed by kernel ID.
+        Each entry carries the REST execution_state and last_activity fields.
+        Returns None if the server could not be queried.
+        """
+        backend = backend or self.default_backend
+        try:
+            response = await backend.http_client.get("/api/kernels")
+            if response.status_code == 200:
+                return {kernel["id"]: kernel for kernel in response.json()}
+            logger.warning(f"Failed to list kernels on backend {backend.name}: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Error listing kernels on backend {backend.name}: {e}")
+        return None
+
+    def _run_in_background(self, coro):
+        """Run a coroutine as a tracked background task"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _request_replenish(self):
+        """Wake the replenisher to re-evaluate the pool size"""
+        self._replenish_event.set()
+
+    def _kernel_deficit(self) -> int:
+        """Number of kernels to create now (call with the lock held)"""
+        idle = self._count_idle_kernels()
+        # Waiters for a session's existing kernel don't need a new one
+        needing_kernel = sum(
+            1 for _, _, _, session_key in self._waiters
+            if self.sessions.get(session_key) not in self.kernels
+        )
+        wanted = max(
+            MIN_KERNELS - len(self.kernels),
+            MIN_IDLE_KERNELS + needing_kernel - idle,
+        ) - self._pending_creations
+        capacity = MAX_KERNELS - len(self.kernels) - self._pending_creations
+        return max(0, min(wanted, capacity))
+
+    async def _replenish_loop(self):
+        """Background task that keeps the pool topped up with warm idle kernels"""
+        while True:
+            try:
+                await self._replenish_event.wait()
+                self._replenish_event.clear()
+                # Re-check unreachable backends now rather than on the next health pass
+                await asyncio.gather(*(
+                    backend.check() for backend in self.backends.values() if not backend.reachable
+                ))
+                async with self.lock:
+                    deficit = self._kernel_deficit()
+                    self._pending_creations += deficit
+                for _ in range(deficit):
+                    self._run_in_background(self._spawn_kernel())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in replenish loop: {e}")
+
+    async def _spawn_kernel(self):
+        """Create and warm up one kernel outside the lock, then add it to the pool"""
+        kernel_info = None
+        reservation_id = None
+        async with self.lock:
+            backend = self._choose_backend()
+            if backend is not None:
+                backend.pending_creations += 1
+        try:
+            # With several workers, MAX_KERNELS counts the kernels of all of them
+            if backend is not None and self.coordinator:
+                try:
+                    reservation_id = self.coordinator.reserve_creation()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not reserve a kernel slot: {e}")
+                else:
+                    if reservation_id is not None:
+                        self._reservations.add(reservation_id)
+            if backend is None:
+                logger.warning("No Jupyter backend can take a new kernel")
+            elif self.coordinator is None or reservation_id is not None:
+                kernel_id = await self._create_new_kernel(backend)
+                if kernel_id:
+                    kernel_info = KernelInfo(kernel_id=kernel_id, backend=backend)
+                    if not await self._warm_up_kernel(kernel_info):
+                        await self._remove_kernel(kernel_info)
+                        kernel_info = None
+        finally:
+            async with self.lock:
+                self._pending_creations -= 1
+                if backend is not None:
+                    backend.pending_creations -= 1
+                if reservation_id is not None:
+                    # Registers the kernel first so it can be leased; the next
+                    # renewal drops the reservation if this fails
+                    self._reservations.discard(reservation_id)
+                    try:
+                        self.coordinator.complete_reservation(reservation_id, kernel_info)
+                    except sqlite3.Error as e:
+                        logger.warning(f"Could not complete kernel reservation {reservation_id}: {e}")
+                        if kernel_info:
+                            self._unregistered_kernels.add(kernel_info.kernel_id)
+                if kernel_info:
+                    self.kernels[kernel_info.kernel_id] = kernel_info
+                    self._dispatch_waiters()
+                    # A kernel waiting for its replacement can go now
+                    self._recycle_kernels()
+        if not kernel_info:
+            await asyncio.sleep(KERNEL_CREATE_RETRY_DELAY)
+        self._request_replenish()
+
+    async def _warm_up_kernel(self, kernel_info: KernelInfo) -> bool:
+        """
+        Run the warm-up preamble on a kernel that is not yet in the pool.
+        Returns False if the kernel did not answer within KERNEL_WARMUP_TIMEOUT.
+        """
+        channel = kernel_info.channel
+        start_time = time.time()
+        try:
+            msg_id, request_json = create_jupyter_request(
+                build_kernel_warmup_code(), channel.session_id, silent=True,
+                user_expressions={"pid": "__import__('os').getpid()"}
+            )
+            async with channel.request(msg_id, request_json) as replies:
+                while True:
+                    remaining = start_time + KERNEL_WARMUP_TIMEOUT - time.time()
+                    message_data = await channel.receive(replies, timeout=max(remaining, 0))
+                    if message_data.get("header", {}).get("msg_type") == "execute_reply":
+                        content = message_data.get("content", {})
+                        break
+        except asyncio.TimeoutError:
+            logger.error(f"Warm-up timed out for kernel {kernel_info.kernel_id} after {KERNEL_WARMUP_TIMEOUT}s")
+            return False
+        except Exception as e:
+            logger.error(f"Warm-up failed for kernel {kernel_info.kernel_id}: {e}")
+            return False
+
+        kernel_info.warmup_seconds = time.time() - start_time
+        with contextlib.suppress(KeyError, TypeError, ValueError):
+            kernel_info.pid = int(content["user_expressions"]["pid"]["data"]["text/plain"])
+        if content.get("status") != "ok":
+            # The kernel itself works, only the configured preamble raised
+            logger.warning(
+                f"Warm-up code raised on kernel {kernel_info.kernel_id}: "
+                f"{content.get('ename')}: {content.get('evalue')}"
+            )
+        logger.info(f"Warmed up kernel {kernel_info.kernel_id} in {kernel_info.warmup_seconds:.2f}s")
+        return True
+
+    def _retire_kernel(self, kernel_id: str, reason: str):
+        """
+        Drop a kernel from the pool and shut it down in the background
+        (call with the lock held). The replenisher creates a replacement.
+        """
+        self.busy_kernels.discard(kernel_id)
+        self._unregistered_kernels.discard(kernel_id)
+        kernel_info = self.kernels.pop(kernel_id, None)
+        if kernel_info is not None:
+            KERNEL_REPLACEMENTS.inc(reason=reason)
+            self._unpin_kernel(kernel_info)
+            if self.coordinator:
+                with contextlib.suppress(sqlite3.Error):
+                    self.coordinator.unregister_kernel(kernel_id)
+            self._run_in_background(self._remove_kernel(kernel_info))
+        self._request_replenish()
+
+    async def _remove_kernel(self, kernel_info: KernelInfo):
+        """Shutdown a kernel on the Jupyter server and close its channel"""
+        kernel_id = kernel_info.kernel_id
+        await kernel_info.channel.close()
+        try:
+            await kernel_info.backend.http_client.delete(f"/api/kernels/{kernel_id}")
             logger.info(f"Removed kernel: {kernel_id}")
         except Exception as e:
             logger.warning(f"Error removing kernel {kernel_id}: {e}")
 
-        if kernel_id in self.kernels:
-            del self.kernels[kernel_id]
-        if kernel_id in self.busy_kernels:
-            self.busy_kernels.remove(kernel_id)
-
-    async def _check_kernel_health(self, kernel_id: str) -> bool:
-        """Check if a kernel is healthy by sending a simple command"""
-        try:
-            jupyter_ws_url = f"{JUPYTER_WS_URL}/api/kernels/{kernel_id}/channels"
-            async with websockets.connect(
-                jupyter_ws_url,
-                ping_interval=WEBSOCKET_PING_INTERVAL,
-                ping_timeout=WEBSOCKET_PING_TIMEOUT
-            ) as ws:
-                # Send simple health check command
-                msg_id, request_json = create_jupyter_request("1+1")
-                await ws.send(request_json)
-
-                # Wait for response with timeout
-                start_time = time.time()
-                while time.time() - start_time < 10:  # 10 second timeout for health check
-                    try:
-                        message_str = await asyncio.wait_for(ws.recv(), timeout=2.0)
-                        message_data = json.loads(message_str)
-                        parent_msg_id = message_data.get("parent_header", {}).get("msg_id")
-
-                        if parent_msg_id == msg_id:
-                            msg_type = message_data.get("header", {}).get("msg_type")
-                            if msg_type == "status" and message_data.get("content", {}).get("execution_state") == "idle":
-                                return True
-                    except asyncio.TimeoutError:
-                        continue
+    async def _check_kernel_health(self, kernel_info: KernelInfo, timeout: Optional[float] = None) -> bool:
+        """Check if a kernel is responsive with a kernel_info_request (runs no user-visible code)"""
+        channel = kernel_info.channel
+        try:
+            msg_id, request_json = create_jupyter_message("kernel_info_request", {}, channel.session_id)
+            async with channel.request(msg_id, request_json) as replies:
+                deadline = time.time() + (KERNEL_HEALTH_CHECK_TIMEOUT if timeout is None else timeout)
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    message_data = await channel.receive(replies, timeout=remaining)
+                    if message_data.get("header", {}).get("msg_type") == "kernel_info_reply":
+                        return message_data.get("content", {}).get("status", "ok") == "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"Health check timed out for kernel {kernel_info.kernel_id}")
             return False
         except Exception as e:
-            logger.warning(f"Health check failed for kernel {kernel_id}: {e}")
+            logger.warning(f"Health check failed for kernel {kernel_info.kernel_id}: {e}")
             return False
 
     async def _health_check_loop(self):
-        """Background task to monitor kernel health"""
+        """
+        Background task to monitor kernel health.
+
+        Probes run concurrently and without holding the lock. Kernels that
+        recently completed an execution are skipped, and kernels the Jupyter
+        server reports as gone or dead are retired without probing. Kernels
+        of an unreachable backend are kept (but not handed out) until it has
+        been down for JUPYTER_BACKEND_RETIRE_AFTER.
+        """
         while True:
             try:
                 await asyncio.sleep(KERNEL_HEALTH_CHECK_INTERVAL)
                 async with self.lock:
-                    unhealthy_kernels = []
-                    for kernel_id, kernel_info in self.kernels.items():
-                        if kernel_info.needs_health_check() and kernel_id not in self.busy_kernels:
-                            if await self._check_kernel_health(kernel_id):
-                                kernel_info.last_health_check = datetime.now()
-                                kernel_info.state = KernelState.HEALTHY
-                            else:
-                                kernel_info.state = KernelState.UNRESPONSIVE
-                                unhealthy_kernels.append(kernel_id)
-
-                    # Remove unhealthy kernels and create replacements
-                    for kernel_id in unhealthy_kernels:
-                        logger.warning(f"Removing unhealthy kernel: {kernel_id}")
-                        await self._remove_kernel(kernel_id)
-                        # Create replacement if below minimum
-                        if len(self.kernels) < MIN_KERNELS:
-                            new_kernel_id = await self._create_new_kernel()
-                            if new_kernel_id:
-                                self.kernels[new_kernel_id] = KernelInfo(kernel_id=new_kernel_id)
+                    self._expire_sessions()
+                    self._recycle_kernels()
+                    self._dispatch_waiters()
+                    candidates = [
+                        kernel_info for kernel_id, kernel_info in self.kernels.items()
+                        if kernel_info.needs_health_check() and kernel_id not in self.busy_kernels
+                        and kernel_id not in self._leased_elsewhere
+                    ]
+                # Unreachable backends are re-checked even without kernels to probe
+                await asyncio.gather(*(
+                    backend.check() for backend in self.backends.values() if not backend.reachable
+                ))
+                if not candidates:
+                    continue
+
+                by_backend: Dict[str, list] = {}
+                for kernel_info in candidates:
+                    by_backend.setdefault(kernel_info.backend.name, []).append(kernel_info)
+                # One cheap REST call per backend covers kernels that died or were culled
+                listings = await asyncio.gather(*(
+                    self.list_remote_kernels(kernel_infos[0].backend) for kernel_infos in by_backend.values()
+                ))
+                to_probe = []
+                results = {}
+                lost = []
+                for kernel_infos, remote_kernels in zip(by_backend.values(), listings):
+                    backend = kernel_infos[0].backend
+                    if remote_kernels is None:
+                        backend.mark_reachable(False)
+                        down_for = datetime.now() - backend.unreachable_since
+                        if down_for > timedelta(seconds=JUPYTER_BACKEND_RETIRE_AFTER):
+                            lost.extend(kernel_info.kernel_id for kernel_info in kernel_infos)
+                        continue
+                    backend.mark_reachable(True)
+                    for kernel_info in kernel_infos:
+                        remote = remote_kernels.get(kernel_info.kernel_id)
+                        if remote is None or remote.get("execution_state") == "dead":
+                            results[kernel_info.kernel_id] = False
+                        else:
+                            to_probe.append(kernel_info)
+
+                probes = await asyncio.gather(*(self._check_kernel_health(kernel_info) for kernel_info in to_probe))
+                results.update(zip((kernel_info.kernel_id for kernel_info in to_probe), probes))
+
+                async with self.lock:
+                    for kernel_id in lost:
+                        if kernel_id in self.kernels and kernel_id not in self.busy_kernels:
+                            logger.warning(f"Giving up kernel {kernel_id}, its backend has been unreachable too long")
+                            self._retire_kernel(kernel_id, reason="backend_down")
+                    for kernel_id, healthy in results.items():
+                        kernel_info = self.kernels.get(kernel_id)
+                        # Skip kernels that were removed or picked up by a request meanwhile
+                        if kernel_info is None or kernel_id in self.busy_kernels or kernel_id in self._leased_elsewhere:
+                            continue
+                        if healthy:
+                            kernel_info.last_health_check = datetime.now()
+                            kernel_info.state = KernelState.HEALTHY
+                        else:
+                            # Remove unhealthy kernels, replacements are created in the background
+                            kernel_info.state = KernelState.UNRESPONSIVE
+                            logger.warning(f"Removing unhealthy kernel: {kernel_id}")
+                            HEALTH_CHECK_FAILURES.inc()
+                            self._retire_kernel(kernel_id, reason="unhealthy")
+
+                    self._dispatch_waiters()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in health check loop: {e}")
 
-# Global kernel pool instance
+@dataclass
+class _ClientSlots:
+    semaphore: asyncio.Semaphore
+    users: int = 0  # holders and waiters, the entry is dropped when this reaches zero
+
+class ExecutionScheduler:
+    """
+    Admission control in front of the kernel pool.
+
+    Each identified client may run at most MAX_CONCURRENT_EXECUTIONS_PER_CLIENT
+    executions of each priority class at once, batch executions are capped pool-wide so interactive
+    calls always find a kernel, and every request has a queue-wait deadline
+    set by its priority class. Requests that pass admission queue for a
+    kernel with their class priority, so interactive calls are served first.
+    """
+
+    def __init__(self):
+        self._clients: Dict[tuple, _ClientSlots] = {}
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self.queued: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+
+    @contextlib.asynccontextmanager
+    async def admit(self, client_id: Optional[str], priority_class: str):
+        """
+        Wait until the request may run and yield the time left before its
+        queue-wait deadline, to be used for acquiring a kernel. Requests
+        without a client_id skip the per-client quota.
+        """
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        deadline = start_time + PRIORITY_CLASS_MAX_QUEUE_WAIT[priority_class]
+        if self._batch_slots is None:
+            self._batch_slots = asyncio.Semaphore(max(MAX_CONCURRENT_BATCH_EXECUTIONS, 1))
+
+        client_key = (client_id, priority_class)
+        client = None
+        if client_id is not None:
+            client = self._clients.setdefault(client_key, _ClientSlots(asyncio.Semaphore(MAX_CONCURRENT_EXECUTIONS_PER_CLIENT)))
+            client.users += 1
+        acquired = []
+        self.queued[priority_class] += 1
+        try:
+            try:
+                for semaphore in (client and client.semaphore, self._batch_slots if priority_class == "batch" else None):
+                    if semaphore is not None:
+                        await asyncio.wait_for(semaphore.acquire(), timeout=max(deadline - loop.time(), 0))
+                        acquired.append(semaphore)
+            except asyncio.TimeoutError:
+                ADMISSION_REJECTIONS.inc(priority=priority_class)
+                TIMEOUTS.inc(tool="execute_python_code", kind="admission")
+                raise AdmissionTimeoutError(
+                    f"Request from client {client_id or 'anonymous'} waited more than "
+                    f"{PRIORITY_CLASS_MAX_QUEUE_WAIT[priority_class]}s for an execution slot"
+                )
+            finally:
+                self.queued[priority_class] -= 1
+
+            wait_time = loop.time() - start_time
+            ADMISSION_WAIT.observe(wait_time, priority=priority_class)
+            if wait_time > 1:
+                logger.info(f"Admitted {priority_class} request from client {client_id or 'anonymous'} after {wait_time:.1f}s")
+
+            self.running[priority_class] += 1
+            try:
+                yield max(deadline - loop.time(), 0)
+            finally:
+                self.running[priority_class] -= 1
+        finally:
+            for semaphore in acquired:
+                semaphore.release()
+            if client is not None:
+                client.users -= 1
+                if client.users == 0:
+                    self._clients.pop(client_key, None)
+
+# Global kernel pool and scheduler instances
 kernel_pool = KernelPool()
+execution_scheduler = ExecutionScheduler()
 
 
 
 # --- HELPER FUNCTION ---
-def create_jupyter_request(code: str) -> tuple[str, str]:
+def create_jupyter_message(msg_type: str, content: dict, session_id: Optional[str] = None, channel: str = "shell") -> tuple[str, str]:
     """
-    Creates a Jupyter execute_request message.
+    Creates a Jupyter message for the kernel channels WebSocket.
+    Pass the channel's session_id to keep all requests on one Jupyter session.
     Returns a tuple: (msg_id, json_payload_string)
     """
     msg_id = uuid.uuid4().hex
-    session_id = uuid.uuid4().hex
+    session_id = session_id or uuid.uuid4().hex
 
-    request = {
+    message = {
         "header": {
             "msg_id": msg_id,
             "username": "mcp_client",
             "session": session_id,
-            "msg_type": "execute_request",
+            "msg_type": msg_type,
             "version": "5.3",
         },
         "parent_header": {},
         "metadata": {},
-        "content": {
+        "content": content,
+        "buffers": [],
+        "channel": channel,
+    }
+    return msg_id, json.dumps(message)
+
+def create_jupyter_request(code: str, session_id: Optional[str] = None, silent: bool = False,
+                           user_expressions: Optional[dict] = None) -> tuple[str, str]:
+    """
+    Creates a Jupyter execute_request message.
+    Returns a tuple: (msg_id, json_payload_string)
+    """
+    return create_jupyter_message(
+        "execute_request",
+        {
             "code": code,
-            "silent": False,
+            "silent": silent,
             "store_history": False,
-            "user_expressions": {},
+            "user_expressions": user_expressions or {},
             "allow_stdin": False,
             "stop_on_error": True,
         },
-        "buffers": [],
-    }
-    return msg_id, json.dumps(request)
+        session_id,
+    )
+
+
+def build_kernel_warmup_code() -> str:
+    """Builds the warm-up preamble from the KERNEL_WARMUP_* settings"""
+    lines = [
+        "import importlib, sys",
+        f"for _path in {KERNEL_WARMUP_SYS_PATHS!r}:",
+        "    if _path not in sys.path:",
+        "        sys.path.append(_path)",
+    ]
+    if KERNEL_WARMUP_MATPLOTLIB_BACKEND is not None:
+        lines += [
+            "try:",
+            f"    importlib.import_module('matplotlib').use({KERNEL_WARMUP_MATPLOTLIB_BACKEND!r})",
+            "except Exception:",
+            "    pass",
+        ]
+    return "\n".join(lines + [
+        f"for _module in {KERNEL_WARMUP_IMPORTS!r}:",
+        "    try:",
+        "        importlib.import_module(_module)",
+        "    except Exception:",
+        "        pass",
+        "_path = _module = None",
+        "del _path, _module",
+        KERNEL_WARMUP_EXTRA_CODE,
+    ])
+
+
+class OutputCollector:
+    """
+    Collects kernel output within a fixed budget.
+
+    The first OUTPUT_HEAD_CHARS and last OUTPUT_TAIL_CHARS characters are
+    kept in memory and everything in between is counted as dropped. As soon
+    as output would be dropped, the full log is streamed to a file under
+    OUTPUT_SPILL_DIR so nothing is lost. References to saved artifacts are
+    kept apart and always rendered, whatever was dropped around them.
+    """
+
+    def __init__(self, name: str, head_chars: Optional[int] = None, tail_chars: Optional[int] = None):
+        self.name = name
+        self.head_chars = OUTPUT_HEAD_CHARS if head_chars is None else head_chars
+        self.tail_chars = OUTPUT_TAIL_CHARS if tail_chars is None else tail_chars
+        self.head: list = []
+        self.head_size = 0
+        self.tail: deque = deque()
+        self.tail_size = 0
+        self.dropped_chars = 0
+        self.spill_path: Optional[pathlib.Path] = None
+        self._spill_file = None
+        self.artifact_references: list = []
+
+    def add_artifact_reference(self, reference: str):
+        self.artifact_references.append(reference)
+        if self._spill_file is not None:
+            self._spill_file.write(reference)
+
+    def append(self, text: str):
+        if not text:
+            return
+        if self._spill_file is not None:
+            self._spill_file.write(text)
+
+        room = self.head_chars - self.head_size
+        if room > 0:
+            self.head.append(text[:room])
+            self.head_size += min(room, len(text))
+            text = text[room:]
+            if not text:
+                return
+
+        self.tail.append(text)
+        self.tail_size += len(text)
+        if self.tail_size > self.tail_chars:
+            if self._spill_file is None and self.spill_path is None:
+                self._start_spill()
+            self._trim_tail()
+
+    def _trim_tail(self):
+        while self.tail_size > self.tail_chars:
+            excess = self.tail_size - self.tail_chars
+            first = self.tail[0]
+            if len(first) <= excess:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+                self.dropped_chars += len(first)
+            else:
+                self.tail[0] = first[excess:]
+                self.tail_size -= excess
+                self.dropped_chars += excess
+
+    def _start_spill(self):
+        """Open the spill file and write everything collected so far (nothing is dropped yet)"""
+        try:
+            OUTPUT_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+            self.spill_path = OUTPUT_SPILL_DIR / f"output-{datetime.now():%Y%m%d-%H%M%S}-{self.name}.log"
+            self._spill_file = open(self.spill_path, "w", encoding="utf-8", errors="replace")
+            self._spill_file.write("".join(self.head))
+            self._spill_file.write("".join(self.tail))
+            self._spill_file.write("".join(self.artifact_references))
+        except OSError as e:
+            logger.warning(f"Could not write full output to {self.spill_path}: {e}")
+            self.spill_path = OUTPUT_SPILL_DIR  # don't retry on every chunk
+            self._spill_file = None
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __bool__(self) -> bool:
+        return self.head_size + self.tail_size > 0 or bool(self.artifact_references)
+
+    def render(self) -> str:
+        """Return the collected output, with a marker where output was dropped, then the artifact references"""
+        references = "".join(self.artifact_references)
+        if not self.dropped_chars:
+            return "".join(self.head) + "".join(self.tail) + references
+        if self._spill_file is not None or (self.spill_path and self.spill_path.is_file()):
+            location = f"full output saved to {self.spill_path}"
+        else:
+            location = "full output could not be saved"
+        marker = f"\n\n... [{self.dropped_chars} characters omitted; {location}] ...\n\n"
+        return "".join(self.head) + marker + "".join(self.tail) + references
+
+
+def _encode_artifact(mime_type: str, value) -> Optional[bytes]:
+    """Decode a mime bundle entry into the bytes to store, or None if it is malformed"""
+    try:
+        if mime_type in ARTIFACT_BASE64_MIME_TYPES:
+            return base64.b64decode(value, validate=False)
+        if isinstance(value, str):
+            return value.encode("utf-8")
+        return json.dumps(value).encode("utf-8")
+    except (binascii.Error, TypeError, ValueError) as e:
+        logger.warning(f"Could not decode {mime_type} output: {e}")
+        return None
+
+async def save_output_artifacts(data: dict, has_text_repr: bool = False) -> list:
+    """
+    Write the rich entries of a display_data/execute_result mime bundle to
+    ARTIFACTS_DIR and return a short reference line for each saved file.
+    Identical content maps to the same file and is only written once.
+    """
+    references = []
+    for mime_type, extension in ARTIFACT_MIME_TYPES.items():
+        if mime_type not in data:
+            continue
+        if mime_type in ARTIFACT_TEXT_FALLBACK_MIME_TYPES and has_text_repr and "text/plain" in data:
+            continue
+        payload = _encode_artifact(mime_type, data[mime_type])
+        if payload is None:
+            continue
+
+        artifact_path = ARTIFACTS_DIR / f"{hashlib.sha256(payload).hexdigest()[:16]}{extension}"
+        try:
+            if artifact_path.exists():
+                # Referenced again, keep it from being pruned as old
+                os.utime(artifact_path)
+            else:
+                ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+                async with aiofiles.open(artifact_path, mode='wb') as f:
+                    await f.write(payload)
+            references.append(f"\n[{mime_type} output saved to {artifact_path} ({len(payload)} bytes)]\n")
+        except OSError as e:
+            logger.warning(f"Could not save {mime_type} output to {artifact_path}: {e}")
+    return references
+
+def prune_outputs() -> int:
+    """
+    Delete saved artifacts and spill logs past OUTPUT_RETENTION_MAX_AGE, then
+    the least recently written ones while they exceed OUTPUT_RETENTION_MAX_BYTES.
+    Returns the number of files deleted.
+    """
+    extensions = set(ARTIFACT_MIME_TYPES.values())
+    candidates = [
+        path for path in ARTIFACTS_DIR.glob("*")
+        if path.suffix in extensions and re.fullmatch(r"[0-9a-f]{16}", path.stem)
+    ]
+    candidates.extend(OUTPUT_SPILL_DIR.glob("output-*.log"))
+    files = []
+    cutoff = time.time() - OUTPUT_RETENTION_MAX_AGE
+    for path in candidates:
+        with contextlib.suppress(OSError):
+            stat = path.stat()
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= OUTPUT_RETENTION_MAX_BYTES:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
+            deleted += 1
+        total -= size
+    return deleted
+
+async def _output_retention_loop():
+    """Background task that keeps saved outputs within the retention limits"""
+    while True:
+        try:
+            deleted = await asyncio.to_thread(prune_outputs)
+            if deleted:
+                logger.info(f"Pruned {deleted} saved outputs from {ARTIFACTS_DIR}")
+        except Exception as e:
+            logger.error(f"Error pruning saved outputs: {e}")
+        await asyncio.sleep(OUTPUT_RETENTION_INTERVAL)
 
 
 # --- ENHANCED EXECUTION WITH RETRY LOGIC ---
 
-async def execute_with_retry(command: str, ctx: Context, max_attempts: int = MAX_RETRY_ATTEMPTS) -> str:
-    """Execute code with retry logic and exponential backoff"""
+class ExecutionTrace:
+    """
+    Phase timestamps of one execute_python_code call.
+
+    Phases are marked in order as the call progresses: queued, admitted,
+    acquired, connected, sent, first_output, idle, released (and backoff
+    before a retry, which marks acquired..released again). The interval
+    ending at each mark is recorded in EXECUTION_PHASE_DURATION and the
+    whole trace is logged as one structured record when it finishes.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:8]
+        self.start = time.perf_counter()
+        self.attempt = 0
+        self.kernel_id: Optional[str] = None
+        self.marks: list = []  # (phase, attempt, seconds since start)
+        self.mark("queued")
+
+    def mark(self, phase: str):
+        self.marks.append((phase, self.attempt, time.perf_counter() - self.start))
+
+    def durations(self) -> list:
+        """(phase, attempt, seconds) of the interval that ended at each mark"""
+        return [
+            (phase, attempt, offset - previous[2])
+            for previous, (phase, attempt, offset) in zip(self.marks, self.marks[1:])
+        ]
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "kernel_id": self.kernel_id,
+            "attempts": self.attempt + 1,
+            "total_seconds": round(time.perf_counter() - self.start, 6),
+            "phases": [
+                {"phase": phase, "attempt": attempt + 1, "seconds": round(seconds, 6)}
+                for phase, attempt, seconds in self.durations()
+            ],
+        }
+
+    def summary(self) -> str:
+        """Compact one-line summary, with the phases of all attempts added up"""
+        totals: Dict[str, float] = {}
+        for phase, _, seconds in self.durations():
+            totals[phase] = totals.get(phase, 0.0) + seconds
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in totals.items())
+        total = (time.perf_counter() - self.start) * 1000
+        attempts = f"{self.attempt + 1} attempt{'s' if self.attempt else ''}"
+        return f"[timing: total {total:.0f}ms; {phases}; {attempts}]"
+
+    def finish(self, outcome: str):
+        """Record the phase durations and log the trace"""
+        for phase, _, seconds in self.durations():
+            EXECUTION_PHASE_DURATION.observe(seconds, phase=phase)
+        if EXECUTION_TIMING_LOG:
+            record = {**self.as_dict(), "outcome": outcome}
+            logger.info(f"Execution timing: {json.dumps(record)}", extra={"execution_timing": record})
+
+
+class ProgressReporter:
+    """
+    Coalesces the progress notifications of one tool call.
+
+    Status messages and stream output are buffered and sent by a background
+    task: output is collected for PROGRESS_COALESCE_WINDOW (or until
+    PROGRESS_MAX_MESSAGE_CHARS are buffered) and at most
+    PROGRESS_MAX_UPDATES_PER_SECOND notifications go out, so the execution
+    loop never waits on a slow client. The progress value is the number of
+    seconds since the call started, so it only ever increases. Nothing is
+    buffered if the client did not ask for progress.
+    """
+
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        self.start = time.perf_counter()
+        self.enabled = _has_progress_token(ctx)
+        self._status: Optional[str] = None
+        self._output: deque = deque()
+        self._output_size = 0
+        self._dropped_chars = 0
+        self._last_progress = 0.0
+        self._last_sent = 0.0
+        self._pending = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, message: str):
+        """Set the status line of the next notification"""
+        if self.enabled and not self._closed:
+            self._status = message
+            self._wake()
+
+    def add_output(self, text: str):
+        """Buffer stream output, keeping only the newest PROGRESS_MAX_MESSAGE_CHARS"""
+        if not self.enabled or self._closed or not text:
+            return
+        self._output.append(text)
+        self._output_size += len(text)
+        while self._output_size - len(self._output[0]) >= PROGRESS_MAX_MESSAGE_CHARS:
+            dropped = self._output.popleft()
+            self._output_size -= len(dropped)
+            self._dropped_chars += len(dropped)
+        self._wake()
+
+    def _wake(self):
+        self._pending.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def _take_message(self) -> Optional[str]:
+        output = "".join(self._output)
+        dropped = self._dropped_chars + max(0, len(output) - PROGRESS_MAX_MESSAGE_CHARS)
+        output = output[-PROGRESS_MAX_MESSAGE_CHARS:].strip()
+        parts = [self._status] if self._status else []
+        if dropped:
+            parts.append(f"... [{dropped} characters of output skipped] ...")
+        if output:
+            parts.append(output)
+        self._status = None
+        self._output.clear()
+        self._output_size = 0
+        self._dropped_chars = 0
+        return "\n".join(parts) or None
+
+    async def _run(self):
+        interval = 1 / PROGRESS_MAX_UPDATES_PER_SECOND
+        while True:
+            await self._pending.wait()
+            # Let more output arrive unless the buffer is full or the call is ending
+            window_end = time.perf_counter() + PROGRESS_COALESCE_WINDOW
+            while not self._closed and self._output_size < PROGRESS_MAX_MESSAGE_CHARS:
+                remaining = window_end - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._pending.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._pending.wait(), remaining)
+            delay = self._last_sent + interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self._pending.clear()
+            message = self._take_message()
+            if message:
+                await self._send(message)
+            if self._closed and not self._pending.is_set():
+                return
+
+    async def _send(self, message: str):
+        progress = max(round(time.perf_counter() - self.start, 3), self._last_progress + 0.001)
+        self._last_progress = progress
+        self._last_sent = time.perf_counter()
+        try:
+            await self.ctx.report_progress(progress=progress, message=message)
+        except Exception as e:
+            logger.debug(f"Could not send progress notification: {e}")
+
+    async def close(self):
+        """Flush buffered output, waiting at most PROGRESS_CLOSE_TIMEOUT for delivery"""
+        self._closed = True
+        if self._task is None:
+            return
+        self._pending.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=PROGRESS_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.debug("Dropped progress notifications that could not be delivered in time")
+
+
+def _has_progress_token(ctx: Context) -> bool:
+    """Whether the client asked for progress notifications for the current call"""
+    try:
+        meta = ctx.request_context.meta
+    except (AttributeError, ValueError):
+        return False
+    return meta is not None and meta.progressToken is not None
+
+
+async def execute_with_retry(command: str, progress: ProgressReporter, max_attempts: int = MAX_RETRY_ATTEMPTS,
+                             session_key: Optional[str] = None, priority: int = 0,
+                             acquire_timeout: Optional[float] = None,
+                             trace: Optional[ExecutionTrace] = None,
+                             execution_timeout: float = WEBSOCKET_TIMEOUT) -> str:
+    """
+    Execute code, retrying with exponential backoff only where that is safe.
+
+    An exception raised by the code itself is returned right away and the
+    kernel goes back to the pool healthy. Only connection failures and dead
+    kernels are retried, and only if the code had not been sent yet, so a
+    request never runs twice. Timeouts and failures after the code was sent
+    are returned without retrying. Code that times out or whose call is
+    cancelled is stopped on the kernel before the kernel is released.
+    """
     last_error = None
+    trace = trace or ExecutionTrace()
 
     for attempt in range(max_attempts):
+        trace.attempt = attempt
         try:
-            # Get kernel from pool
-            kernel_id = await kernel_pool.get_available_kernel()
-            if not kernel_id:
-                raise NoKernelAvailableError("No available kernels in pool")
+            # Get kernel from pool (waits in the queue if all kernels are busy)
+            try:
+                with KERNEL_ACQUIRE_WAIT.time(tool="execute_python_code"):
+                    kernel_id = await kernel_pool.get_available_kernel(
+                        priority=priority, timeout=acquire_timeout, session_key=session_key
+                    )
+            except NoKernelAvailableError as e:
+                # The acquisition deadline has already been spent waiting, don't retry
+                logger.error(f"Could not acquire a kernel: {e}")
+                kind = "queue_full" if isinstance(e, KernelPoolSaturatedError) else "acquire"
+                TIMEOUTS.inc(tool="execute_python_code", kind=kind)
+                return f"Error: {str(e)}"
+            trace.kernel_id = kernel_id
+            trace.mark("acquired")
 
             try:
-                result = await _execute_on_kernel(kernel_id, command, ctx)
+                with KERNEL_EXECUTION_DURATION.time(tool="execute_python_code"):
+                    result = await _execute_on_kernel(kernel_id, command, progress, trace, execution_timeout)
                 # Release kernel back to pool on success
                 await kernel_pool.release_kernel(kernel_id, failed=False)
+                trace.mark("released")
                 return result
+            except KernelExecutionError as e:
+                # The user's code raised, the kernel itself is fine
+                await kernel_pool.release_kernel(kernel_id, failed=False)
+                trace.mark("released")
+                return f"Error: {str(e)}"
+            except KernelTimeoutError as e:
+                # Stop the runaway code so it doesn't keep the kernel busy
+                progress.update("Timed out, interrupting...")
+                outcome = await kernel_pool.stop_execution(kernel_id)
+                await kernel_pool.release_kernel(kernel_id, failed=outcome is None)
+                trace.mark("released")
+                if outcome == "interrupted":
+                    return f"Error: {str(e)}. The code was interrupted."
+                if outcome == "restarted":
+                    return f"Error: {str(e)}. The kernel had to be restarted, its variables are lost."
+                return f"Error: {str(e)}. The kernel could not be stopped and will be replaced."
+            except asyncio.CancelledError:
+                # The client went away: stop the code and release the kernel in the background
+                logger.info(f"Execution on kernel {kernel_id} was cancelled, interrupting it")
+                kernel_pool._run_in_background(_stop_and_release(kernel_id))
+                raise
             except Exception as e:
                 # Release kernel as failed
                 await kernel_pool.release_kernel(kernel_id, failed=True)
+                trace.mark("released")
                 raise e
 
         except Exception as e:
             last_error = e
+            if not isinstance(e, KernelConnectionError) or e.execution_started:
+                logger.error(f"Execution failed, not retrying: {e}")
+                return f"Error: {str(e)}"
             if attempt < max_attempts - 1:
                 backoff_time = RETRY_BACKOFF_BASE ** attempt
+                EXECUTION_RETRIES.inc(tool="execute_python_code")
                 logger.warning(f"Execution attempt {attempt + 1} failed: {e}. Retrying in {backoff_time}s...")
                 await asyncio.sleep(backoff_time)
+                trace.mark("backoff")
             else:
                 logger.error(f"All {max_attempts} execution attempts failed. Last error: {e}")
 
     return f"Error: Execution failed after {max_attempts} attempts. Last error: {str(last_error)}"
 
-async def _execute_on_kernel(kernel_id: str, command: str, ctx: Context) -> str:
+async def _stop_and_release(kernel_id: str):
+    """Stop whatever a cancelled call left running on its kernel, then release the kernel"""
+    outcome = await kernel_pool.stop_execution(kernel_id)
+    await kernel_pool.release_kernel(kernel_id, failed=outcome is None)
+
+async def _execute_on_kernel(kernel_id: str, command: str, progress: ProgressReporter, trace: ExecutionTrace,
+                             timeout: float = WEBSOCKET_TIMEOUT) -> str:
     """Execute code on a specific kernel with enhanced timeout handling"""
-    jupyter_ws_url = f"{JUPYTER_WS_URL}/api/kernels/{kernel_id}/channels"
-    final_output_lines = []
+    output = None
     sent_msg_id = None
+    sent = False
 
     try:
-        # Enhanced WebSocket connection with longer timeouts
-        async with websockets.connect(
-            jupyter_ws_url,
-            ping_interval=WEBSOCKET_PING_INTERVAL,
-            ping_timeout=WEBSOCKET_PING_TIMEOUT,
-            close_timeout=10
-        ) as jupyter_ws:
-            sent_msg_id, jupyter_request_json = create_jupyter_request(command)
-            await jupyter_ws.send(jupyter_request_json)
+        # Reuse the kernel's long-lived channel connection
+        try:
+            channel = kernel_pool.get_channel(kernel_id)
+            await channel.connect()
+        except Exception as e:
+            raise KernelConnectionError(f"Could not connect to kernel {kernel_id}: {e}")
+        trace.mark("connected")
+        sent_msg_id, jupyter_request_json = create_jupyter_request(command, channel.session_id)
+        output = OutputCollector(sent_msg_id[:8])
+        async with channel.request(sent_msg_id, jupyter_request_json) as replies:
+            sent = True
+            trace.mark("sent")
             logger.info(f"Sent execute_request to kernel {kernel_id} (msg_id: {sent_msg_id})")
 
             execution_complete = False
+            awaiting_first_output = True
+            error_message = None
             start_time = time.time()
             last_activity = start_time
 
             # Progress reporting for long operations
-            await ctx.report_progress(progress=10, message=f"Executing on kernel {kernel_id[:8]}...")
+            progress.update(f"Executing on kernel {kernel_id[:8]}...")
 
-            while not execution_complete and (time.time() - start_time) < WEBSOCKET_TIMEOUT:
+            while not execution_complete and (time.time() - start_time) < timeout:
                 try:
                     # Adaptive timeout based on recent activity
                     current_time = time.time()
@@ -414,96 +2465,171 @@ async def _execute_on_kernel(kernel_id: str, command: str, ctx: Context) -> str:
 
                     # Use shorter timeout if no recent activity, longer if active
                     recv_timeout = 30.0 if time_since_activity > 60 else 5.0
+                    recv_timeout = min(recv_timeout, max(start_time + timeout - current_time, 0.01))
 
-                    message_str = await asyncio.wait_for(jupyter_ws.recv(), timeout=recv_timeout)
+                    message_data = await channel.receive(replies, timeout=recv_timeout)
                     last_activity = current_time
 
                 except asyncio.TimeoutError:
                     # Send periodic progress updates during long operations
                     elapsed = time.time() - start_time
-                    await ctx.report_progress(progress=30, message=f"Still executing... ({elapsed:.0f}s elapsed)")
-                    continue
-
-                try:
-                    message_data = json.loads(message_str)
-                except json.JSONDecodeError:
-                    logger.warning(f"Received invalid JSON from kernel {kernel_id}")
-                    continue
-
-                parent_msg_id = message_data.get("parent_header", {}).get("msg_id")
-
-                if parent_msg_id != sent_msg_id:
+                    progress.update(f"Still executing... ({elapsed:.0f}s elapsed)")
                     continue
 
                 msg_type = message_data.get("header", {}).get("msg_type")
                 content = message_data.get("content", {})
 
+                if awaiting_first_output and msg_type in ("stream", "execute_result", "display_data", "error"):
+                    awaiting_first_output = False
+                    trace.mark("first_output")
+
                 if msg_type == "stream":
                     stream_text = content.get("text", "")
-                    final_output_lines.append(stream_text)
-                    # Stream output as progress
-                    await ctx.report_progress(progress=50, message=stream_text.strip())
+                    output.append(stream_text)
+                    # Stream output as (coalesced) progress
+                    progress.add_output(stream_text)
 
                 elif msg_type in ["execute_result", "display_data"]:
-                    result_text = content.get("data", {}).get("text/plain", "")
-                    final_output_lines.append(result_text)
+                    data = content.get("data", {})
+                    output.append(data.get("text/plain", ""))
+                    # Keep figures and other rich outputs as files instead of discarding them
+                    for reference in await save_output_artifacts(data, has_text_repr=msg_type == "execute_result"):
+                        output.add_artifact_reference(reference)
 
                 elif msg_type == "error":
+                    # Keep reading until idle: requests sent to the kernel before
+                    # then would be aborted because of this error
                     error_traceback = "\n".join(content.get("traceback", []))
-                    logger.error(f"Execution error on kernel {kernel_id} for msg_id {sent_msg_id}:\n{error_traceback}")
-                    raise KernelExecutionError(f"Execution Error:\n{error_traceback}")
+                    logger.info(f"Code raised {content.get('ename')} on kernel {kernel_id} (msg_id: {sent_msg_id})")
+                    error_message = f"Execution Error:\n{error_traceback}"
 
                 elif msg_type == "status" and content.get("execution_state") == "idle":
                     execution_complete = True
-                    await ctx.report_progress(progress=100, message="Execution completed")
+                    trace.mark("idle")
+                    progress.update("Execution completed")
 
             if not execution_complete:
                 elapsed = time.time() - start_time
                 timeout_msg = f"Execution timed out after {elapsed:.0f} seconds on kernel {kernel_id}"
                 logger.error(f"Execution timed out for msg_id: {sent_msg_id}")
+                TIMEOUTS.inc(tool="execute_python_code", kind="execution")
                 raise KernelTimeoutError(timeout_msg)
 
-            return "".join(final_output_lines) if final_output_lines else "[Execution successful with no output]"
+            output.close()
+            if error_message is not None:
+                if output:
+                    error_message += f"\n\nOutput before the error:\n{output.render()}"
+                raise KernelExecutionError(error_message)
+            return output.render() if output else "[Execution successful with no output]"
 
     except websockets.exceptions.ConnectionClosed as e:
         error_msg = f"WebSocket connection to kernel {kernel_id} closed unexpectedly: {e}"
+        if sent:
+            error_msg += ". The code may have partly run and was not retried"
         logger.error(error_msg)
-        raise KernelError(error_msg)
+        raise KernelConnectionError(error_msg, execution_started=sent)
     except websockets.exceptions.WebSocketException as e:
         error_msg = f"WebSocket error with kernel {kernel_id}: {e}"
         logger.error(error_msg)
-        raise KernelError(error_msg)
+        raise KernelConnectionError(error_msg, execution_started=sent)
+    except KernelError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error during execution on kernel {kernel_id}: {e}", exc_info=True)
         raise e
+    finally:
+        if output is not None:
+            output.close()
+
+def _get_request_header(ctx: Context, name: str) -> Optional[str]:
+    """Read a header of the HTTP request behind the current MCP call, if any"""
+    try:
+        request = ctx.request_context.request
+    except (AttributeError, ValueError):
+        return None
+    if request is None:
+        return None
+    return request.headers.get(name)
+
+def _get_session_key(ctx: Context, session_key: Optional[str]) -> Optional[str]:
+    """Use the explicit session key, or fall back to the MCP session ID of the request"""
+    if session_key:
+        return session_key
+    if not STICKY_SESSIONS_ENABLED:
+        return None
+    return _get_request_header(ctx, "mcp-session-id")
+
+def _get_client_id(ctx: Context) -> Optional[str]:
+    """
+    Identify the caller for per-client quotas. Returns None when the request
+    carries neither header (e.g. stateless HTTP with several workers), rather
+    than putting all such callers behind one shared quota.
+    """
+    return _get_request_header(ctx, CLIENT_ID_HEADER) or _get_request_header(ctx, "mcp-session-id")
 
 # --- MCP TOOLS ---
 @mcp.tool()
-async def execute_python_code(command: str, ctx: Context) -> str:
+@instrumented_tool
+async def execute_python_code(command: str, ctx: Context, session_key: Optional[str] = None,
+                              priority: Optional[str] = None, timeout: Optional[float] = None) -> str:
     """
     Executes a string of Python code in a persistent Jupyter kernel and returns the final output.
     Uses kernel pool management with automatic retry and recovery for long-running operations.
     Streams intermediate output (stdout) as progress updates.
+    Calls from the same conversation run on the same kernel, so variables persist between calls.
 
     Args:
         command: The Python code to execute as a single string.
         ctx: The MCP Context object, used for reporting progress.
+        session_key: Optional key to pin calls to one kernel. Defaults to the MCP session.
+        priority: 'interactive' (default) for quick calls, or 'batch' for long-running jobs.
+        timeout: Optional seconds the code may run before it is interrupted. Defaults to 600.
     """
+    priority_class = priority or _get_request_header(ctx, PRIORITY_HEADER) or DEFAULT_PRIORITY_CLASS
+    if priority_class not in PRIORITY_CLASSES:
+        return f"Error: Unknown priority '{priority_class}'. Use one of: {', '.join(PRIORITY_CLASSES)}"
+    if timeout is not None and not 0 < timeout <= MAX_EXECUTION_TIMEOUT:
+        return f"Error: timeout must be between 0 and {MAX_EXECUTION_TIMEOUT} seconds"
+
+    trace = ExecutionTrace()
+    progress = ProgressReporter(ctx)
+    outcome = "error"
     try:
         # Initialize kernel pool if not already done
         if not kernel_pool._initialized:
-            await ctx.report_progress(progress=10, message="Initializing kernel pool...")
+            progress.update("Initializing kernel pool...")
             await kernel_pool.initialize()
-
-        # Execute with retry logic
-        result = await execute_with_retry(command, ctx)
+            trace.mark("pool_initialized")
+
+        # Wait for an execution slot, then execute with retry logic
+        async with execution_scheduler.admit(_get_client_id(ctx), priority_class) as remaining_wait:
+            trace.mark("admitted")
+            result = await execute_with_retry(
+                command, progress,
+                session_key=_get_session_key(ctx, session_key),
+                priority=PRIORITY_CLASSES[priority_class],
+                acquire_timeout=min(remaining_wait, KERNEL_ACQUIRE_TIMEOUT),
+                trace=trace,
+                execution_timeout=timeout or WEBSOCKET_TIMEOUT,
+            )
+        outcome = "error" if result.startswith("Error") else "ok"
+        if EXECUTION_TIMING_IN_RESULT:
+            result = f"{result}\n\n{trace.summary()}"
         return result
 
+    except AdmissionTimeoutError as e:
+        outcome = "rejected"
+        logger.warning(f"Rejected execution: {e}")
+        return f"Error: {str(e)}"
     except Exception as e:
         logger.error(f"Fatal error in execute_python_code: {e}", exc_info=True)
         return f"Error: Failed to execute code: {str(e)}"
+    finally:
+        await progress.close()
+        trace.finish(outcome)
 
 @mcp.tool()
+@instrumented_tool
 async def navigate_and_get_all_visible_text(url: str) -> str:
     """
     Retrieves all visible text from the entire webpage using Playwright.
@@ -512,6 +2638,7 @@ async def navigate_and_get_all_visible_text(url: str) -> str:
         url: The URL of the webpage from which to retrieve text.
     """
     # This function doesn't have intermediate steps, so it only needs 'return'.
+    scrape_start = time.perf_counter()
     try:
         # Note: 'async with async_playwright() as p:' can be slow.
         # For performance, consider managing a single Playwright instance
@@ -528,9 +2655,11 @@ async def navigate_and_get_all_visible_text(url: str) -> str:
             await browser.close()
 
             # The operation is complete, return the final result.
+            PAGE_SCRAPE_DURATION.observe(time.perf_counter() - scrape_start, outcome="ok")
             return visible_text
 
     except Exception as e:
+        PAGE_SCRAPE_DURATION.observe(time.perf_counter() - scrape_start, outcome="error")
         logger.error(f"Failed to retrieve all visible text: {e}")
         # An error occurred, return the final error message.
         return f"Error: Failed to retrieve all visible text: {str(e)}"
@@ -539,98 +2668,562 @@ async def navigate_and_get_all_visible_text(url: str) -> str:
 # --- SKILLS MANAGEMENT TOOLS ---
 
 
-async def _parse_skill_frontmatter(skill_md_path):
+def _parse_skill_frontmatter(content: str) -> dict:
+    """Parse the key: value lines of the frontmatter block at the top of a SKILL.md"""
+    frontmatter = []
+    in_frontmatter = False
+    for line in content.splitlines():
+        if line.strip() == '---':
+            if in_frontmatter:
+                break
+            else:
+                in_frontmatter = True
+                continue
+        if in_frontmatter:
+            frontmatter.append(line)
+
+    metadata = {}
+    for line in frontmatter:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            metadata[key.strip()] = value.strip()
+    return metadata
+
+_SEARCH_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _search_terms(text: str) -> list:
+    return _SEARCH_TOKEN_PATTERN.findall(text.lower())
+
+def _skill_search_terms(name: str, directory_name: str, description: str, body: str) -> Dict[str, int]:
+    """Field-weighted term frequencies of a skill for the search index"""
+    frequencies: Dict[str, int] = {}
+    for text, weight in (
+        (f"{name} {directory_name}", SKILL_SEARCH_NAME_WEIGHT),
+        (description, SKILL_SEARCH_DESCRIPTION_WEIGHT),
+        (body, 1),
+    ):
+        for term in _search_terms(text):
+            frequencies[term] = frequencies.get(term, 0) + weight
+    return frequencies
+
+@dataclass
+class SkillEntry:
+    name: str
+    description: str
+    category: str  # "public" or "user"
+    path: pathlib.Path  # the skill's directory
+    mtime_ns: int  # of its SKILL.md
+    terms: Dict[str, int] = field(default_factory=dict, repr=False)  # for SkillSearchIndex
+
+class SkillSearchIndex:
+    """
+    BM25 ranked inverted index over skill names, descriptions and SKILL.md
+    bodies, updated one skill at a time as the skill index changes. Updates
+    run in a thread and hold the mutex per skill, so a search never waits
+    for more than one skill's update.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[tuple, int]] = {}  # term -> {skill key: weighted frequency}
+        self.lengths: Dict[tuple, int] = {}
+        self.total_length = 0
+        self._terms: Dict[tuple, list] = {}
+        self._mutex = threading.Lock()
+
+    def add(self, key: tuple, terms: Dict[str, int]):
+        with self._mutex:
+            self._remove(key)
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[key] = frequency
+            self._terms[key] = list(terms)
+            self.lengths[key] = sum(terms.values())
+            self.total_length += self.lengths[key]
+
+    def remove(self, key: tuple):
+        with self._mutex:
+            self._remove(key)
+
+    def _remove(self, key: tuple):
+        if key not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(key)
+        for term in self._terms.pop(key):
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query: str, limit: int) -> list:
+        """The keys of the best matching skills with their scores, best first"""
+        with self._mutex:
+            return self._search(query, limit)
+
+    def _search(self, query: str, limit: int) -> list:
+        count = len(self.lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores: Dict[tuple, float] = {}
+        for term in set(_search_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                norm = self.K1 * (1 - self.B + self.B * self.lengths[key] / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+class SkillIndex:
+    """
+    In-memory index of the skills in PUBLIC_SKILLS_DIR and USER_SKILLS_DIR.
+
+    Built once and refreshed every SKILL_INDEX_REFRESH_INTERVAL by a
+    background task, so list_skills never touches the filesystem. A refresh
+    lists a skills directory only when its mtime changed (a skill was added
+    or removed) and stats the SKILL.md of new skills and of directories that
+    had none yet. Editing a SKILL.md in place doesn't change its directory's
+    mtime, so every SKILL_INDEX_FULL_SCAN_INTERVAL a full scan stats all of
+    them. A SKILL.md is only re-parsed when its own mtime changed.
+    Scans run in a thread and swap in new dicts, readers never see a
+    half-updated index.
+
+    Skill archives (.zip) in the archive category's directory are unpacked
+    by a thread pool once their size and mtime stopped changing between two
+    scans, and the index is refreshed when they are in place.
+
+    Changed skills are also applied to a SkillSearchIndex for search_skills.
+    """
+
+    def __init__(self, directories: Dict[str, pathlib.Path], archive_category: Optional[str] = None):
+        self.directories = directories
+        self.archive_category = archive_category
+        self.skills: Dict[tuple, SkillEntry] = {}  # (category, directory name) -> entry
+        # Every directory seen, None while it has no SKILL.md
+        self._tracked: Dict[tuple, Optional[SkillEntry]] = {}
+        self.version = 0  # incremented whenever a skill was added, removed or changed
+        self._directory_mtimes: Dict[str, int] = {}
+        self._last_full_scan = 0.0
+        self._views: Dict[Optional[str], tuple] = {}  # category (None = all) -> (sorted entries, their sort keys)
+        self.search_index = SkillSearchIndex()
+        self._built = False
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._archives: Dict[pathlib.Path, tuple] = {}  # archive -> (size, mtime_ns) at the last scan
+        self._ingesting: Set[pathlib.Path] = set()
+        self._ingest_tasks: Set[asyncio.Task] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        """Build the index and keep it fresh in the background"""
+        await self.refresh(full=True)
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        tasks = [self._refresh_task, *self._ingest_tasks]
+        for task in tasks:
+            if task:
+                task.cancel()
+        for task in tasks:
+            if task:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._refresh_task = None
+        if self._executor:
+            # Running extractions finish in their thread, they only ever rename complete skills into place
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def refresh(self, full: bool = False):
+        """Pick up added and removed skills now, and with full=True skills edited in place"""
+        async with self._lock:
+            if full:
+                self._last_full_scan = time.monotonic()
+            tracked, directory_mtimes, archives, changed = await asyncio.to_thread(self._scan, full)
+            self._tracked, self._directory_mtimes = tracked, directory_mtimes
+            self.skills = {key: entry for key, entry in tracked.items() if entry is not None}
+            if changed:
+                self.version += 1
+                self._views = {}
+                await asyncio.to_thread(self._update_search_index, changed, self.skills)
+            self._built = True
+
+            # Archives that didn't change since the last scan are completely written
+            for archive, stat in archives.items():
+                if self._archives.get(archive) == stat and archive not in self._ingesting:
+                    self._ingesting.add(archive)
+                    task = asyncio.create_task(self._ingest(archive))
+                    self._ingest_tasks.add(task)
+                    task.add_done_callback(self._ingest_tasks.discard)
+            self._archives = archives
+
+    async def _ingest(self, archive: pathlib.Path):
+        """Unpack a skill archive in the thread pool, then pick up its skills"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=SKILL_ARCHIVE_WORKERS, thread_name_prefix="skill-archive")
+        try:
+            installed = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _extract_skill_archive, archive, archive.parent
+            )
+            if installed is not None:
+                logger.info(f"Installed skills from {archive.name}: {', '.join(installed)}")
+        except (zipfile.BadZipFile, ValueError, OSError) as e:
+            logger.error(f"Could not install skill archive {archive.name}: {e}")
+        try:
+            await self.refresh()
+        finally:
+            # Only now, a scan from before the archive was removed could submit it again
+            self._ingesting.discard(archive)
+
+    async def entries(self, category: Optional[str] = None) -> list:
+        """Skills sorted by category and name, optionally of one category"""
+        return (await self._view(category))[0]
+
+    async def page(self, category: Optional[str], cursor: Optional[str], limit: int) -> tuple:
+        """
+        Up to limit skills in entries() order that come after the cursor,
+        and the cursor of the next page (None on the last one). A cursor
+        names the last skill of its page, so paging stays consistent while
+        skills are added or removed. Raises ValueError for an invalid cursor.
+        """
+        entries, keys = await self._view(category)
+        start = 0 if cursor is None else bisect.bisect_right(keys, self._decode_cursor(cursor))
+        if start + limit >= len(entries):
+            return entries[start:], None
+        return entries[start:start + limit], self._encode_cursor(keys[start + limit - 1])
+
+    async def _view(self, category: Optional[str]) -> tuple:
+        if not self._built:
+            await self.refresh()
+        view = self._views.get(category)
+        if view is None:
+            if category is None:
+                entries = sorted(self.skills.values(), key=self._sort_key)
+            else:
+                entries = [entry for entry in (await self._view(None))[0] if entry.category == category]
+            view = self._views[category] = (entries, [self._sort_key(entry) for entry in entries])
+        return view
+
+    def _sort_key(self, entry: SkillEntry) -> tuple:
+        return (list(self.directories).index(entry.category), entry.name, entry.path.name)
+
+    def _encode_cursor(self, key: tuple) -> str:
+        category_index, name, directory_name = key
+        value = json.dumps([list(self.directories)[category_index], name, directory_name])
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> tuple:
+        try:
+            category, name, directory_name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return (list(self.directories).index(category), str(name), str(directory_name))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid cursor '{cursor}'") from e
+
+    async def search(self, query: str, limit: int) -> list:
+        """The skills best matching a free-text query, best first"""
+        if not self._built:
+            await self.refresh()
+        return [self.skills[key] for key, _ in self.search_index.search(query, limit) if key in self.skills]
+
+    def _update_search_index(self, changed: Set[tuple], skills: Dict[tuple, SkillEntry]):
+        """Apply added, removed and edited skills to the search index (runs in a thread)"""
+        for key in changed:
+            entry = skills.get(key)
+            if entry is None:
+                self.search_index.remove(key)
+            else:
+                self.search_index.add(key, entry.terms)
+
+    def _scan(self, full: bool = False) -> tuple:
+        """Compute the new index from the filesystem (runs in a thread)"""
+        skills = dict(self._tracked)
+        directory_mtimes = dict(self._directory_mtimes)
+        archives = {}
+        for archive in self._archives:
+            with contextlib.suppress(OSError):
+                stat = archive.stat()
+                archives[archive] = (stat.st_size, stat.st_mtime_ns)
+        changed = set()  # keys of added, removed and edited skills
+        for category, directory in self.directories.items():
+            try:
+                mtime_ns = directory.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            added = set()
+            if mtime_ns != directory_mtimes.get(category):
+                # Skills were added or removed, list the directory again
+                names = set()
+                if mtime_ns is not None:
+                    with contextlib.suppress(OSError):
+                        for item in os.scandir(directory):
+                            if item.name.startswith('.'):
+                                # Staging directories of archives being unpacked
+                                continue
+                            if item.is_dir():
+                                names.add(item.name)
+                            elif category == self.archive_category and '.zip.ingesting-' in item.name:
+                                _reclaim_skill_archive(pathlib.Path(item.path))
+                            elif category == self.archive_category and item.name.endswith('.zip'):
+                                archive = pathlib.Path(item.path)
+                                if archive not in archives:
+                                    # Seen for the first time, unpacked once it stops changing
+                                    stat = item.stat()
+                                    archives[archive] = (stat.st_size, stat.st_mtime_ns)
+                for key in [key for key in skills if key[0] == category and key[1] not in names]:
+                    if skills.pop(key) is not None:
+                        changed.add(key)
+                added = {name for name in names if (category, name) not in skills}
+                for name in added:
+                    skills[(category, name)] = None
+                directory_mtimes[category] = mtime_ns
+
+            for key in [key for key in skills if key[0] == category]:
+                entry = skills[key]
+                if not full and entry is not None and key[1] not in added:
+                    continue
+                skill_md_path = directory / key[1] / "SKILL.md"
+                try:
+                    skill_md_mtime = skill_md_path.stat().st_mtime_ns
+                except OSError:
+                    # Not a skill (yet), checked again on the next scan
+                    if entry is not None:
+                        changed.add(key)
+                    skills[key] = None
+                    continue
+                if entry is not None and entry.mtime_ns == skill_md_mtime:
+                    continue
+                try:
+                    content = skill_md_path.read_text()
+                except (OSError, UnicodeDecodeError):
+                    content = ""
+                metadata = _parse_skill_frontmatter(content)
+                name = metadata.get("name", key[1])
+                description = metadata.get("description", "No description available.")
+                skills[key] = SkillEntry(
+                    name=name,
+                    description=description,
+                    category=category,
+                    path=directory / key[1],
+                    mtime_ns=skill_md_mtime,
+                    terms=_skill_search_terms(name, key[1], description, content),
+                )
+                changed.add(key)
+        return skills, directory_mtimes, archives, changed
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(SKILL_INDEX_REFRESH_INTERVAL)
+                await self.refresh(full=time.monotonic() - self._last_full_scan >= SKILL_INDEX_FULL_SCAN_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing the skill index: {e}")
+
+def _reclaim_skill_archive(claimed: pathlib.Path):
+    """Put back an archive claimed by a worker process on this host that has died"""
+    with contextlib.suppress(ValueError, OSError):
+        original, pid = claimed.name.rsplit('.ingesting-', 1)
+        try:
+            os.kill(int(pid), 0)
+            return
+        except ProcessLookupError:
+            pass
+        logger.warning(f"Skill archive {original} was left behind by worker {pid}, unpacking it again")
+        os.rename(claimed, claimed.with_name(original))
+
+def _extract_skill_archive(archive: pathlib.Path, destination: pathlib.Path) -> Optional[list]:
+    """
+    Unpack a skill archive into destination (runs in a worker thread).
+
+    The archive is first claimed by renaming it to .zip.ingesting-<pid>, so
+    with several workers only one unpacks it; returns None if another worker
+    got it first. It is extracted into a hidden staging directory next to
+    the skills, and each of its top-level directories with a SKILL.md is
+    renamed into place, replacing an older version of that skill. An archive
+    with SKILL.md at its root is a single skill named after the archive. The
+    archive is deleted afterwards, or renamed to .zip.invalid if it can't be
+    installed. Returns the names of the installed skills, raises ValueError
+    if it contains none.
+    """
+    claimed = archive.with_name(f"{archive.name}.ingesting-{os.getpid()}")
     try:
-        async with aiofiles.open(skill_md_path, mode='r') as f:
-            content = await f.read()
-            frontmatter = []
-            in_frontmatter = False
-            for line in content.splitlines():
-                if line.strip() == '---':
-                    if in_frontmatter:
-                        break
-                    else:
-                        in_frontmatter = True
-                        continue
-                if in_frontmatter:
-                    frontmatter.append(line)
-            
-            metadata = {}
-            for line in frontmatter:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    metadata[key.strip()] = value.strip()
-            return metadata
+        os.rename(archive, claimed)
+    except FileNotFoundError:
+        return None
+    staging = destination / f".staging-{uuid.uuid4().hex}"
+    try:
+        with zipfile.ZipFile(claimed, 'r') as zip_ref:
+            zip_ref.extractall(staging)
+        if (staging / "SKILL.md").is_file():
+            candidates = {archive.stem: staging}
+        else:
+            candidates = {
+                item.name: item for item in staging.iterdir()
+                if item.is_dir() and not item.name.startswith(('.', '__MACOSX'))
+            }
+
+        installed = []
+        for name, path in candidates.items():
+            if not (path / "SKILL.md").is_file():
+                logger.warning(f"Skipping '{name}' in {archive.name}: it has no SKILL.md")
+                continue
+            target = destination / name
+            replaced = None
+            if target.exists():
+                replaced = destination / f".replaced-{uuid.uuid4().hex}"
+                os.rename(target, replaced)
+            os.rename(path, target)
+            if replaced is not None:
+                shutil.rmtree(replaced, ignore_errors=True)
+            installed.append(name)
+        if not installed:
+            raise ValueError("no skill directory with a SKILL.md in the archive")
+        claimed.unlink()
+        return installed
     except Exception:
-        return {}
+        # Set the archive aside so it isn't picked up again
+        with contextlib.suppress(OSError):
+            os.rename(claimed, archive.with_name(archive.name + ".invalid"))
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+skill_index = SkillIndex({"public": PUBLIC_SKILLS_DIR, "user": USER_SKILLS_DIR}, archive_category="user")
 
 @mcp.tool()
-async def list_skills() -> str:
+@instrumented_tool
+async def list_skills(category: Optional[str] = None, limit: int = LIST_SKILLS_DEFAULT_LIMIT,
+                      cursor: Optional[str] = None, names_only: bool = False) -> str:
     """
     Lists all available skills in the Open-Skills container.
 
     Returns a list of available skills organized by category (public/user).
     Public skills are built into the container, while user skills are added by users.
+    Large catalogs are returned in pages; use search_skills to find a skill for a task.
+
+    Args:
+        category: Optional 'public' or 'user' to list only that category.
+        limit: Maximum number of skills per page (default 100, at most 500).
+        cursor: Cursor of the next page, as given at the end of the previous page.
+        names_only: List only skill names, without descriptions.
 
     Returns:
-        JSON string with skill names organized by category.
+        Skill names and descriptions organized by category.
     """
+    if category is not None and category not in skill_index.directories:
+        return f"Error: Unknown category '{category}'. Use one of: {', '.join(skill_index.directories)}"
+    if not 1 <= limit <= LIST_SKILLS_MAX_LIMIT:
+        return f"Error: limit must be between 1 and {LIST_SKILLS_MAX_LIMIT}"
     try:
-        # Unzip any user-provided skills
-        if USER_SKILLS_DIR.exists():
-            for item in USER_SKILLS_DIR.iterdir():
-                if item.is_file() and item.suffix == '.zip':
-                    with zipfile.ZipFile(item, 'r') as zip_ref:
-                        zip_ref.extractall(USER_SKILLS_DIR)
-                    os.remove(item)
-
-        skills = {
-            "public": [],
-            "user": []
-        }
+        # Sorted by name for consistent output (user-provided .zip archives
+        # are unpacked by the skill index in the background)
+        try:
+            skills, next_cursor = await skill_index.page(category, cursor, limit)
+        except ValueError as e:
+            return f"Error: {str(e)}"
+
+        lines = ["Available Skills:", ""]
+        for name in ([category] if category else skill_index.directories):
+            total = len(await skill_index.entries(name))
+            page_skills = [skill for skill in skills if skill.category == name]
+            if total and not page_skills:
+                # On another page
+                continue
+            title = f"{name.capitalize()} Skills ({total})"
+            if names_only:
+                lines.append(f"{title}: {', '.join(skill.name for skill in page_skills) or '(none)'}")
+            else:
+                lines.append(f"{title}:")
+                lines.extend(f"  - {skill.name}: {skill.description}" for skill in page_skills)
+                if not page_skills:
+                    lines.append("  (none)")
+            lines.append("")
 
-        # Helper to process a skills directory
-        async def process_skill_dir(directory, category):
-            if directory.exists():
-                for skill_dir in directory.iterdir():
-                    if skill_dir.is_dir():
-                        skill_md_path = skill_dir / "SKILL.md"
-                        if skill_md_path.exists():
-                            metadata = await _parse_skill_frontmatter(skill_md_path)
-                            skills[category].append({
-                                "name": metadata.get("name", skill_dir.name),
-                                "description": metadata.get("description", "No description available.")
-                            })
-
-        await process_skill_dir(PUBLIC_SKILLS_DIR, "public")
-        await process_skill_dir(USER_SKILLS_DIR, "user")
-
-        # Sort for consistent output
-        skills["public"].sort(key=lambda x: x['name'])
-        skills["user"].sort(key=lambda x: x['name'])
-
-        result = f"Available Skills:\n\n"
-        result += f"Public Skills ({len(skills['public'])}):\n"
-        if skills["public"]:
-            for skill in skills["public"]:
-                result += f"  - {skill['name']}: {skill['description']}\n"
-        else:
-            result += "  (none)\n"
+        if next_cursor is not None:
+            lines.append(f'More skills follow: call list_skills again with cursor="{next_cursor}".')
+        lines.append("Use get_skill_info(skill_name) to read documentation for a specific skill.")
+        return "\n".join(lines)
 
-        result += f"\nUser Skills ({len(skills['user'])}):\n"
-        if skills["user"]:
-            for skill in skills["user"]:
-                result += f"  - {skill['name']}: {skill['description']}\n"
-        else:
-            result += "  (none)\n"
+    except Exception as e:
+        logger.error(f"Failed to list skills: {e}")
+        return f"Error: Failed to list skills: {str(e)}"
 
-        result += f"\nUse get_skill_info(skill_name) to read documentation for a specific skill."
 
-        return result
+@mcp.tool()
+@instrumented_tool
+async def search_skills(query: str, limit: int = 10) -> str:
+    """
+    Searches the available skills by name, description and documentation.
+    Prefer this over list_skills to find a skill for a task when there are many skills.
+
+    Args:
+        query: Words describing the task (e.g., 'rotate image', 'fill pdf form')
+        limit: Maximum number of skills to return (default 10, at most 50)
 
+    Returns:
+        The best matching skills, most relevant first.
+    """
+    if not query.strip():
+        return "Error: query must not be empty"
+    if not 1 <= limit <= SKILL_SEARCH_MAX_LIMIT:
+        return f"Error: limit must be between 1 and {SKILL_SEARCH_MAX_LIMIT}"
+    try:
+        matches = await skill_index.search(query, limit)
     except Exception as e:
-        logger.error(f"Failed to list skills: {e}")
-        return f"Error: Failed to list skills: {str(e)}"
+        logger.error(f"Failed to search skills: {e}")
+        return f"Error: Failed to search skills: {str(e)}"
+
+    if not matches:
+        return f"No skills match '{query}'. Use list_skills() to see all available skills."
+    lines = [f"Skills matching '{query}' ({len(matches)}):"]
+    lines.extend(f"  - {skill.name} ({skill.category}): {skill.description}" for skill in matches)
+    lines.append("")
+    lines.append("Use get_skill_info(skill_name) to read documentation for a specific skill.")
+    return "\n".join(lines)
+
+
+class SkillFileCache:
+    """
+    LRU cache of skill files, already rewritten for this container.
+
+    Entries are keyed by skill and filename and remember the category and
+    mtime they were read with, so an edited or replaced file is read again.
+    The least recently used files are evicted once the cached content
+    exceeds max_chars.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()  # (skill, filename) -> (skill_type, mtime_ns, content)
+
+    def get(self, skill_name: str, filename: str, skill_type: str, mtime_ns: int) -> Optional[str]:
+        entry = self._entries.get((skill_name, filename))
+        if entry is None or entry[:2] != (skill_type, mtime_ns):
+            SKILL_FILE_CACHE_REQUESTS.inc(result="miss")
+            return None
+        self._entries.move_to_end((skill_name, filename))
+        SKILL_FILE_CACHE_REQUESTS.inc(result="hit")
+        return entry[2]
+
+    def put(self, skill_name: str, filename: str, skill_type: str, mtime_ns: int, content: str):
+        old = self._entries.pop((skill_name, filename), None)
+        if old is not None:
+            self.size -= len(old[2])
+        if len(content) > self.max_chars:
+            return
+        self._entries[(skill_name, filename)] = (skill_type, mtime_ns, content)
+        self.size += len(content)
+        while self.size > self.max_chars:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+skill_file_cache = SkillFileCache(SKILL_FILE_CACHE_MAX_CHARS)
 
 
 async def _read_skill_file(skill_name: str, filename: str) -> tuple[str, str, str]:
@@ -653,16 +3246,19 @@ async def _read_skill_file(skill_name: str, filename: str) -> tuple[str, str, st
 
         skill_file_path = None
         skill_type = None
+        mtime_ns = None
 
-        if public_skill_file.exists():
-            skill_file_path = public_skill_file
-            skill_type = "public"
-        elif user_skill_file.exists():
-            skill_file_path = user_skill_file
-            skill_type = "user"
-        else:
+        for skill_type, skill_file_path in (("public", public_skill_file), ("user", user_skill_file)):
+            with contextlib.suppress(OSError):
+                mtime_ns = skill_file_path.stat().st_mtime_ns
+                break
+        if mtime_ns is None:
             return None, None, f"Error: File '{filename}' not found in skill '{skill_name}'. Use list_skills() to see available skills."
 
+        content = skill_file_cache.get(skill_name, filename, skill_type, mtime_ns)
+        if content is not None:
+            return content, skill_type, None
+
         # Read the file content
         async with aiofiles.open(skill_file_path, mode='r') as f:
             content = await f.read()
@@ -670,6 +3266,7 @@ async def _read_skill_file(skill_name: str, filename: str) -> tuple[str, str, st
         # Replace all occurrences of /mnt/user-data with /app/uploads
         content = content.replace('/mnt/user-data', '/app/uploads')
 
+        skill_file_cache.put(skill_name, filename, skill_type, mtime_ns, content)
         return content, skill_type, None
 
     except Exception as e:
@@ -678,6 +3275,7 @@ async def _read_skill_file(skill_name: str, filename: str) -> tuple[str, str, st
 
 
 @mcp.tool()
+@instrumented_tool
 async def get_skill_info(skill_name: str) -> str:
     """
     Retrieves the documentation (SKILL.md) for a specific skill.
@@ -702,6 +3300,7 @@ async def get_skill_info(skill_name: str) -> str:
 
 
 @mcp.tool()
+@instrumented_tool
 async def get_skill_file(skill_name: str, filename: str) -> str:
     """
     Retrieves any markdown file from a skill's directory.
@@ -731,5 +3330,73 @@ async def get_skill_file(skill_name: str, filename: str) -> str:
     return header + content
 
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request) -> PlainTextResponse:
+    """Prometheus scrape endpoint for the kernel pool, scheduler and tools (of all workers)"""
+    text = render_worker_metrics() if MCP_WORKERS > 1 else render_metrics()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@mcp.custom_route("/backends", methods=["GET"])
+async def list_backends(request) -> JSONResponse:
+    """Status of the Jupyter backends kernels are placed on"""
+    busy = kernel_pool.busy_kernels | kernel_pool._leased_elsewhere
+    return JSONResponse([
+        {
+            "name": backend.name,
+            "http_url": backend.http_url,
+            "weight": backend.weight,
+            "max_kernels": backend.max_kernels,
+            "reachable": backend.reachable,
+            "draining": backend.draining,
+            "kernels": sum(1 for k in kernel_pool.kernels.values() if k.backend is backend),
+            "busy_kernels": sum(1 for k in kernel_pool.kernels.values() if k.backend is backend and k.kernel_id in busy),
+        }
+        for backend in kernel_pool.backends.values()
+    ])
+
+@mcp.custom_route("/backends/{name}/drain", methods=["POST"])
+async def drain_backend(request) -> JSONResponse:
+    """Stop placing kernels on a backend and retire its kernels as they become idle"""
+    return await _set_backend_draining(request.path_params["name"], True)
+
+@mcp.custom_route("/backends/{name}/undrain", methods=["POST"])
+async def undrain_backend(request) -> JSONResponse:
+    """Place kernels on a drained backend again"""
+    return await _set_backend_draining(request.path_params["name"], False)
+
+async def _set_backend_draining(name: str, draining: bool) -> JSONResponse:
+    if not kernel_pool._initialized:
+        await kernel_pool.initialize()
+    try:
+        retired = await kernel_pool.drain_backend(name, draining)
+    except KeyError:
+        return JSONResponse({"error": f"Unknown backend '{name}'"}, status_code=404)
+    return JSONResponse({"name": name, "draining": draining, "retired_kernels": retired})
+
+
 # Use the streamable_http_app as it's the modern standard
-app = mcp.streamable_http_app()
\ No newline at end of file
+app = mcp.streamable_http_app()
+
+# Wrap the MCP session manager lifespan so the skill index is built at startup,
+# and pooled connections and the shared HTTP client are closed on shutdown
+_mcp_lifespan = app.router.lifespan_context
+
+@contextlib.asynccontextmanager
+async def _app_lifespan(app):
+    async with _mcp_lifespan(app):
+        export_task = asyncio.create_task(_metrics_export_loop()) if MCP_WORKERS > 1 else None
+        retention_task = asyncio.create_task(_output_retention_loop())
+        try:
+            await skill_index.start()
+            yield
+        finally:
+            retention_task.cancel()
+            if export_task is not None:
+                export_task.cancel()
+                with contextlib.suppress(OSError):
+                    (METRICS_DIR / f"{WORKER_ID}.prom").unlink()
+            await skill_index.close()
+            await kernel_pool.shutdown()
+
+app.router.lifespan_context = _app_lifespan
\ No newline at end of file